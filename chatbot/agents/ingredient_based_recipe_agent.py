@@ -15,6 +15,9 @@ load_dotenv()
 DATABASE_URL = os.environ.get("DATABASE_URL")
 DEFAULT_MODEL = os.environ.get("DEFAULT_MODEL")
 
+# Number of alternative recipes suggested next to the best one
+MAX_ALTERNATIVES = 3
+
 class IngredientBasedRecipeAgent:
     def __init__(self, api_url=DATABASE_URL, llm=None):
         """
@@ -56,7 +59,8 @@ class IngredientBasedRecipeAgent:
             ingredients: A list of ingredient names
             
         Returns:
-            Dict containing the best recipe and product details with locations
+            Dict containing the best recipe, product details with locations
+            and the next best recipes as alternatives
         """
         try:
             # Convert ingredient names to product IDs
@@ -69,21 +73,21 @@ class IngredientBasedRecipeAgent:
             # Prepare the payload for the API request
             ingredient_ids_query = "&".join([f"ingredient_ids={pid}" for pid in product_ids])
             
-            # Call the API to get the best recipe by ingredients
+            # Call the API to get the best recipes by ingredients, ranked in a single request
             response = requests.post(
-                f"{self.api_url}/recipes/best-by-ingredients?{ingredient_ids_query}"
+                f"{self.api_url}/recipes/ranked-by-ingredients?{ingredient_ids_query}&k={MAX_ALTERNATIVES + 1}"
             )
             
             if response.status_code != 200:
                 return {"error": f"API returned status code {response.status_code}", "details": response.text}
             
-            best_recipe = response.json()
+            ranked_recipes = response.json()
             
-            if "error" in best_recipe:
-                return {"error": best_recipe["error"]}
+            if not ranked_recipes:
+                return {"error": "Nessuna ricetta trovata per gli ingredienti forniti."}
             
-            # Extract the recipe ID from the response
-            recipe_id = best_recipe.get("id")
+            # Extract the recipe ID of the best match from the response
+            recipe_id = ranked_recipes[0]["recipe"].get("id")
             if not recipe_id:
                 return {"error": "Nessun ID ricetta trovato nella risposta dell'API."}
             
@@ -95,6 +99,18 @@ class IngredientBasedRecipeAgent:
             
             recipe_details = recipe_details_response.json()
             
+            # The other ranked recipes are offered as alternatives, without extra calls
+            recipe_details["alternatives"] = [
+                {
+                    "id": ranked["recipe"].get("id", ""),
+                    "name": ranked["recipe"].get("name", ""),
+                    "description": ranked["recipe"].get("description", ""),
+                    "matched_count": ranked.get("matched_count", 0),
+                    "coverage": ranked.get("coverage", 0)
+                }
+                for ranked in ranked_recipes[1:]
+            ]
+            
             # Return the detailed recipe information
             return recipe_details
         
@@ -141,6 +157,7 @@ class IngredientBasedRecipeAgent:
             }
 
         transformed_results = self._transform_recipe_results(recipe, ingredients_details)
+        transformed_results["alternatives"] = result.get("alternatives", [])
 
         return {
             "text": None,
@@ -247,23 +264,20 @@ class IngredientBasedRecipeAgent:
             A list of product IDs corresponding to the ingredient names, or None if not found.
         """
         logger.info(f"IngredientBasedRecipeAgent.get_product_ids: Getting product IDs for: {ingredient_names}")
-        product_ids = []
-        for name in ingredient_names:
-            try:
-                response = requests.get(f"{self.api_url}/products/", params={"name": name})
-                if response.status_code == 200:
-                    products = response.json()
-                    if products:
-                        # Assume the first matching product is the correct one
-                        product_ids.append(products[0]["id"])
-                    else:
-                        product_ids.append(None)  # No match found
-                else:
-                    print(f"Errore API per l'ingrediente '{name}': {response.status_code}")
-                    product_ids.append(None)  # API error
-            except requests.exceptions.RequestException as e:
-                print(f"Errore di connessione all'API per l'ingrediente '{name}': {str(e)}")
-                product_ids.append(None)  # Connection error
+        if not ingredient_names:
+            return []
+
+        # All the names are resolved with a single request
+        try:
+            response = requests.post(f"{self.api_url}/products/resolve", json={"names": ingredient_names})
+            if response.status_code == 200:
+                product_ids = [match["product_id"] for match in response.json()]
+            else:
+                print(f"Errore API nella risoluzione degli ingredienti: {response.status_code}")
+                product_ids = [None] * len(ingredient_names)  # API error
+        except requests.exceptions.RequestException as e:
+            print(f"Errore di connessione all'API per gli ingredienti: {str(e)}")
+            product_ids = [None] * len(ingredient_names)  # Connection error
         return product_ids
 
 if __name__ == "__main__":
@@ -16,6 +16,10 @@ load_dotenv()
 DATABASE_URL = os.environ.get("DATABASE_URL")
 DEFAULT_MODEL = os.environ.get("DEFAULT_MODEL")
 
+# Only the product fields used by _transform_search_results. No limit is sent:
+# filter mode pages in id order, so a limit would drop matches, not the worst ones.
+SEARCH_FIELDS = "name,description,category,attributes"
+
 class ProductSearchAgent:
     def __init__(self, api_url=DATABASE_URL, llm=None):
         """
@@ -65,7 +69,8 @@ class ProductSearchAgent:
             
             # Call the search API
             search_payload = {
-                "name": product_name
+                "name": product_name,
+                "fields": SEARCH_FIELDS
             }
             
             logger.info(f"ProductSearchAgent.search_products: Sending API request with payload: {search_payload}, api url is {self.api_url}")
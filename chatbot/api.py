@@ -165,6 +165,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Initialize other components after FastAPI app is created
@@ -409,14 +410,24 @@ async def send_event(client_id, event: EventType):
 
 # Add new endpoints for log dashboard
 @app.get("/dashboard/logs/")
-async def get_logs(limit: int = 1000):
+async def get_logs(limit: int = 100, since: Optional[str] = None, cursor: Optional[str] = None):
     """
-    Proxy endpoint to fetch logs from the product API
+    Proxy endpoint to fetch logs from the product API.
+    Pass `since` to only get logs newer than the last one seen, or the
+    X-Next-Cursor header of the previous page as `cursor` to page back.
     """
     try:
-        response = requests.get(f"{DATABASE_URL}/logs/?limit={limit}")
+        params = {"limit": limit}
+        if since:
+            params["since"] = since
+        if cursor:
+            params["cursor"] = cursor
+        response = requests.get(f"{DATABASE_URL}/logs/", params=params)
         response.raise_for_status()
-        return response.json()
+        headers = {}
+        if "X-Next-Cursor" in response.headers:
+            headers["X-Next-Cursor"] = response.headers["X-Next-Cursor"]
+        return JSONResponse(content=response.json(), headers=headers)
     except Exception as e:
         logger.error(f"Error fetching logs: {str(e)}")
         return JSONResponse(
@@ -425,12 +436,14 @@ async def get_logs(limit: int = 1000):
         )
 
 @app.get("/dashboard/logs/stats")
-async def get_logs_stats():
+async def get_logs_stats(days: Optional[int] = None):
     """
-    Proxy endpoint to fetch log statistics from the product API
+    Proxy endpoint to fetch log statistics from the product API,
+    optionally restricted to the last `days` days
     """
     try:
-        response = requests.get(f"{DATABASE_URL}/logs/stats")
+        params = {"days": days} if days else {}
+        response = requests.get(f"{DATABASE_URL}/logs/stats", params=params)
         response.raise_for_status()
         return response.json()
     except Exception as e:
@@ -4,6 +4,8 @@ const API_BASE_URL = getWebUrl(); // Use the same origin as the dashboard
 // Dati globali
 let statsData = null;
 let allLogs = [];
+// Maximum number of logs kept for the search type / term table
+const MAX_LOGS = 1000;
 // Store chart instances so we can destroy them before creating new ones
 let charts = {
     searchTypeChart: null,
@@ -34,12 +36,19 @@ async function loadStats() {
 
 async function loadLogs() {
     try {
-        const response = await fetch(`${API_BASE_URL}/dashboard/logs/?limit=1000`);
+        // After the first load only ask for the logs newer than the latest one we have
+        const params = new URLSearchParams({ limit: MAX_LOGS });
+        if (allLogs.length > 0) {
+            params.set('since', allLogs[0].timestamp);
+        }
+        
+        const response = await fetch(`${API_BASE_URL}/dashboard/logs/?${params}`);
         if (!response.ok) {
             throw new Error('Errore nel caricamento dei log');
         }
         
-        allLogs = await response.json();
+        const newLogs = await response.json();
+        allLogs = newLogs.concat(allLogs).slice(0, MAX_LOGS);
         
         updateSearchTypeTermTable();
     } catch (error) {
@@ -0,0 +1,183 @@
+"""
+Latency and backend round-trip benchmark of the product_api hot paths.
+
+Runs product_api in process on the SQLite backend, against a database made
+by generate_data.py (generated first if missing), and reports latency
+percentiles and backend queries per request for each scenario. With
+--baseline the results are compared with a previous --output file and the
+exit status is 1 on regressions, for CI-like runs.
+
+Usage (from the database directory; needs httpx for the test client):
+    python benchmarks/bench_api.py --path bench.db [--requests 200] [--output results.json]
+    python benchmarks/bench_api.py --path bench.db --baseline results.json [--tolerance 1.5]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import generate_data
+
+
+class RoundTripCounter:
+    """
+    ASGI wrapper keeping the backend round trips of the last request, as
+    counted by product_api in the context of the request. Queries made by
+    background snapshot and index loads are not charged to it.
+    """
+
+    def __init__(self, app, product_api):
+        self.app = app
+        self.product_api = product_api
+        self.last = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        self.product_api.reset_round_trips()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.last = self.product_api.round_trips()
+
+
+def sample_inputs(source, rnd, count):
+    """Search terms, recipe ids and ingredient sets taken from the database."""
+    products = source.table("products").select("id,name").limit(5000).execute().data
+    recipes = source.table("recipes").select("id,name").limit(5000).execute().data
+    ingredients = source.table("recipe_ingredients").select("recipe_id,product_id").limit(20000).execute().data
+
+    by_recipe = {}
+    for ingredient in ingredients:
+        by_recipe.setdefault(ingredient["recipe_id"], []).append(ingredient["product_id"])
+    ingredient_sets = list(by_recipe.values())
+
+    return {
+        "terms": [rnd.choice(products)["name"].split()[0].lower() for _ in range(count)],
+        "recipe_names": [" ".join(rnd.choice(recipes)["name"].split()[:3]) for _ in range(count)],
+        "recipe_ids": [rnd.choice(recipes)["id"] for _ in range(count)],
+        "ingredient_sets": [rnd.sample(ids, min(len(ids), 3)) + [rnd.choice(products)["id"]]
+                            for ids in (rnd.choice(ingredient_sets) for _ in range(count))]
+    }
+
+
+def scenarios(inputs):
+    """Scenario name -> function sending the i-th request with a test client."""
+    return {
+        "search": lambda client, i: client.post("/search/", json={"name": inputs["terms"][i]}),
+        "search_ranked": lambda client, i: client.post("/search/", json={"name": inputs["terms"][i], "mode": "ranked"}),
+        "search_recipes": lambda client, i: client.post("/search_recipes/", json={"name": inputs["recipe_names"][i]}),
+        "recipe_detail": lambda client, i: client.get(f"/recipes/{inputs['recipe_ids'][i]}"),
+        "best_by_ingredients": lambda client, i: client.post(
+            "/recipes/best-by-ingredients", params={"ingredient_ids": inputs["ingredient_sets"][i]}
+        ),
+        "logs_stats": lambda client, i: client.get("/logs/stats")
+    }
+
+
+def run(client, counter, send, requests, warmup):
+    """Latency percentiles (ms) and mean backend round trips of `requests` requests, after `warmup` ones."""
+    for i in range(warmup):
+        send(client, i)
+
+    latencies, queries = [], []
+    for i in range(requests):
+        started = time.perf_counter()
+        response = send(client, i)
+        latencies.append((time.perf_counter() - started) * 1000)
+        queries.append(counter.last)
+        if response.status_code >= 500:
+            raise RuntimeError(f"{response.request.url}: {response.status_code} {response.text[:200]}")
+
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        "requests": requests,
+        "p50": float(p50),
+        "p95": float(p95),
+        "p99": float(p99),
+        "max": float(max(latencies)),
+        "round_trips": float(np.mean(queries))
+    }
+
+
+def regressions(results, baseline, tolerance):
+    """Scenarios whose p95 grew by more than `tolerance` times or which make more round trips."""
+    found = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        if result["p95"] > previous["p95"] * tolerance:
+            found.append(f"{name}: p95 {result['p95']:.2f} ms (baseline {previous['p95']:.2f} ms)")
+        if result["round_trips"] > previous["round_trips"] + 0.5:
+            found.append(f"{name}: {result['round_trips']:.1f} round trips (baseline {previous['round_trips']:.1f})")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--path", default="bench.db", help="SQLite database, generated if missing")
+    parser.add_argument("--products", type=int, default=100000, help="Products to generate if the database is missing")
+    parser.add_argument("--recipes", type=int, default=20000, help="Recipes to generate if the database is missing")
+    parser.add_argument("--logs", type=int, default=1000000, help="Search logs to generate if the database is missing")
+    parser.add_argument("--requests", type=int, default=200, help="Measured requests per scenario")
+    parser.add_argument("--warmup", type=int, default=10, help="Requests per scenario before measuring")
+    parser.add_argument("--scenario", action="append", help="Only run these scenarios")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="JSON results to compare with")
+    parser.add_argument("--tolerance", type=float, default=1.5, help="Allowed p95 growth factor over the baseline")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.path):
+        print(f"Generating {args.path}...")
+        generate_data.generate(args.path, args.products, args.recipes, args.logs, seed=args.seed)
+
+    # product_api reads its configuration when imported
+    os.environ["DATA_BACKEND"] = "sqlite"
+    os.environ["SQLITE_PATH"] = args.path
+    import product_api
+    from fastapi.testclient import TestClient
+
+    rnd = random.Random(args.seed)
+    source = product_api.get_data_source()
+    inputs = sample_inputs(source, rnd, args.requests + args.warmup)
+    counter = RoundTripCounter(product_api.app, product_api)
+
+    results = {}
+    with TestClient(counter) as client:
+        # Measure with every snapshot and index loaded
+        product_api.warm_up_snapshots()
+        for name, send in scenarios(inputs).items():
+            if args.scenario and name not in args.scenario:
+                continue
+            results[name] = run(client, counter, send, args.requests, args.warmup)
+
+    print(f"{'scenario':22} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9} {'round trips':>12}")
+    for name, result in results.items():
+        print(f"{name:22} {result['p50']:9.2f} {result['p95']:9.2f} {result['p99']:9.2f} "
+              f"{result['max']:9.2f} {result['round_trips']:12.1f}")
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            found = regressions(results, json.load(baseline), args.tolerance)
+        for regression in found:
+            print(f"REGRESSION {regression}")
+        sys.exit(1 if found else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Serialization cost of ProductWithLocation responses, per 1000 rows.
+
+Compares the default path of the list endpoints (validation against the
+response model, jsonable_encoder, JSONResponse) with the FAST_RESPONSES
+path (rows shaped like the model, FastJSONResponse, orjson when installed),
+after checking that both paths send the same JSON.
+
+Usage (from the database directory):
+    python benchmarks/bench_serialization.py [--rows 1000] [--repeat 20]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+# Import product_api without a Supabase connection
+os.environ.setdefault("DATA_BACKEND", "sqlite")
+os.environ.setdefault("SQLITE_PATH", ":memory:")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+
+import product_api
+
+
+def make_rows(count):
+    """
+    Rows shaped like the results of /stores/{store_id}/products, with some
+    optional fields missing and some columns the response model drops.
+    """
+    return [
+        {
+            "product": {
+                "id": f"p{i}",
+                "name": f"Prodotto {i}",
+                "description": f"Descrizione del prodotto numero {i}",
+                "category": f"categoria{i % 20}",
+                "tags": ["bio", f"tag{i % 7}"],
+                "attributes": {"brand": f"Marca {i % 50}", "size": "500g", "weight": 0.5 + i % 10 if i % 3 else i % 10},
+                "created_at": "2024-01-01T00:00:00"
+            },
+            "location": {
+                "product_id": f"p{i}",
+                "store_id": "s1",
+                "aisle": str(i % 12),
+                "section": "ABCDE"[i % 5],
+                "shelf": str(i % 4),
+                "coordinates": {"x": float(i % 40), "y": float(i % 25)}
+            },
+            **({"store": {"id": "s1", "name": "Store 1", "address": "Via Roma 1", "layout": {"aisles": 12, "sections": 5}}}
+               if i % 4 else {"quantity": 2})
+        }
+        for i in range(count)
+    ]
+
+
+def response_field():
+    for route in product_api.app.routes:
+        if getattr(route, "path", None) == "/stores/{store_id}/products":
+            return route.response_field
+    raise RuntimeError("route /stores/{store_id}/products not found")
+
+
+loop = asyncio.new_event_loop()
+
+
+def validated(rows, field):
+    content = loop.run_until_complete(serialize_response(field=field, response_content=rows))
+    return JSONResponse(content).body
+
+
+def fast(rows, field):
+    return product_api.FastJSONResponse(product_api.shape_rows(rows, product_api.ProductWithLocation)).body
+
+
+def measure(function, rows, field, repeat):
+    """Best time of `repeat` runs, in milliseconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(rows, field)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    rows, field = make_rows(args.rows), response_field()
+    encoder = "orjson" if product_api.orjson is not None else "json"
+    if json.loads(validated(rows, field)) != json.loads(fast(rows, field)):
+        sys.exit("FAST_RESPONSES output differs from the response model output")
+    per_1k = 1000 / args.rows
+
+    before = measure(validated, rows, field, args.repeat)
+    after = measure(fast, rows, field, args.repeat)
+    print(f"{args.rows} ProductWithLocation rows, best of {args.repeat}")
+    print(f"{'response_model + JSONResponse':32} {before * per_1k:8.2f} ms per 1k rows")
+    print(f"{f'FastJSONResponse ({encoder})':32} {after * per_1k:8.2f} ms per 1k rows")
+    print(f"speedup: {before / after:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+Reproducible synthetic catalog for benchmarks, written to a SQLite database.
+
+The tables have the same columns as the Supabase ones (see sqlite_backend.SCHEMA)
+and the rows the shapes transform_data expects. The same seed always
+produces the same data.
+
+Usage (from the database directory):
+    python benchmarks/generate_data.py --path bench.db [--products 100000] [--recipes 20000] [--logs 1000000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlite_backend import SQLiteDataSource
+
+# Rows inserted per statement batch
+INSERT_BATCH_SIZE = 10000
+
+CATEGORIES = {
+    "latticini": ["latte", "yogurt", "mozzarella", "burro", "panna", "ricotta", "parmigiano", "stracchino"],
+    "pasta": ["spaghetti", "penne", "fusilli", "rigatoni", "lasagne", "tagliatelle", "farfalle", "orecchiette"],
+    "ortofrutta": ["pomodori", "zucchine", "melanzane", "patate", "cipolle", "carote", "mele", "limoni", "basilico"],
+    "carne": ["pollo", "manzo", "maiale", "salsiccia", "tacchino", "macinato", "prosciutto", "pancetta"],
+    "pesce": ["salmone", "tonno", "merluzzo", "gamberi", "cozze", "vongole", "acciughe"],
+    "dispensa": ["olio", "aceto", "sale", "zucchero", "farina", "riso", "passata", "legumi", "caffe"],
+    "forno": ["pane", "grissini", "focaccia", "crackers", "biscotti", "fette biscottate"],
+    "bevande": ["acqua", "succo", "birra", "vino", "aranciata", "te freddo"]
+}
+QUALIFIERS = ["bio", "integrale", "fresco", "light", "classico", "senza glutine", "extra", "della casa", "DOP", "al naturale"]
+BRANDS = [f"Marca {letter}" for letter in "ABCDEFGHIJKLMNOPQRST"]
+SIZES = ["100g", "250g", "500g", "1kg", "1l", "750ml", "6x1.5l", "confezione famiglia"]
+RECIPE_DISHES = ["risotto", "pasta", "insalata", "zuppa", "torta", "frittata", "arrosto", "sugo", "vellutata", "crostata"]
+UNITS = ["g", "kg", "ml", "l", "pz", "cucchiai"]
+SEARCH_TYPES = ["product", "product_advanced", "recipe", "recipe_advanced", "product_resolve"]
+
+
+def generate_stores(rnd, count):
+    return [
+        {
+            "id": f"store-{number}",
+            "name": f"Supermercato {number}",
+            "address": f"Via {rnd.choice(['Roma', 'Milano', 'Garibaldi', 'Mazzini', 'Verdi'])} {rnd.randint(1, 200)}",
+            "aisles": rnd.randint(8, 24),
+            "sections": rnd.randint(4, 8)
+        }
+        for number in range(1, count + 1)
+    ]
+
+
+def generate_products(rnd, count):
+    categories = list(CATEGORIES)
+    products = []
+    for number in range(count):
+        category = rnd.choice(categories)
+        base = rnd.choice(CATEGORIES[category])
+        qualifier = rnd.choice(QUALIFIERS)
+        products.append({
+            "id": f"prod-{number:07d}",
+            "name": f"{base.capitalize()} {qualifier} {number}",
+            "description": f"{base.capitalize()} {qualifier}, {category}",
+            "category": category,
+            "tags": [base, category] + ([qualifier] if rnd.random() < 0.5 else []),
+            "brand": rnd.choice(BRANDS),
+            "size": rnd.choice(SIZES),
+            "weight": round(rnd.uniform(0.05, 5.0), 2)
+        })
+    return products
+
+
+def generate_locations(rnd, products, stores, stores_per_product):
+    """Every product is stocked in 1..stores_per_product stores, in an aisle of each."""
+    for product in products:
+        for store in rnd.sample(stores, rnd.randint(1, min(stores_per_product, len(stores)))):
+            aisle = rnd.randint(1, store["aisles"])
+            yield {
+                "product_id": product["id"],
+                "store_id": store["id"],
+                "aisle": str(aisle),
+                "section": chr(ord("A") + rnd.randrange(store["sections"])),
+                "shelf": str(rnd.randint(1, 5)),
+                "x_coordinate": aisle * 10 + rnd.randint(-2, 2),
+                "y_coordinate": rnd.randint(0, 60)
+            }
+
+
+def generate_recipes(rnd, count, products, max_ingredients):
+    recipes, ingredients = [], []
+    for number in range(count):
+        dish = rnd.choice(RECIPE_DISHES)
+        chosen = rnd.sample(products, rnd.randint(2, max_ingredients))
+        recipe_id = f"recipe-{number:06d}"
+        recipes.append({
+            "id": recipe_id,
+            "name": f"{dish.capitalize()} con {chosen[0]['name'].split()[0].lower()} {number}",
+            "description": f"{dish.capitalize()} con " + ", ".join(product["name"].split()[0].lower() for product in chosen)
+        })
+        ingredients.extend(
+            {
+                "recipe_id": recipe_id,
+                "product_id": product["id"],
+                "quantity": rnd.choice([1, 2, 100, 200, 250, 500]),
+                "unit": rnd.choice(UNITS)
+            }
+            for product in chosen
+        )
+    return recipes, ingredients
+
+
+def generate_logs(rnd, count, products, days):
+    """Search logs spread over the last `days` days, oldest first."""
+    now = datetime.now()
+    start = now - timedelta(days=days)
+    step = (now - start) / max(count, 1)
+    for number in range(count):
+        search_type = rnd.choice(SEARCH_TYPES)
+        term = rnd.choice(products)["name"].split()[0].lower() if rnd.random() < 0.9 else f"introvabile {rnd.randint(1, 500)}"
+        found = not term.startswith("introvabile")
+        yield {
+            "id": str(uuid.UUID(int=rnd.getrandbits(128))),
+            "search_type": search_type,
+            "query_term": term,
+            "found": found,
+            "timestamp": (start + step * number).isoformat(),
+            "details": {"results_count": rnd.randint(1, 50) if found else 0}
+        }
+
+
+def insert_all(source, table, rows):
+    """Insert rows (a list or a generator) in batches of INSERT_BATCH_SIZE. Returns the number of rows."""
+    batch, total = [], 0
+    for row in rows:
+        batch.append(row)
+        if len(batch) == INSERT_BATCH_SIZE:
+            total += len(source.insert(table, batch))
+            batch = []
+    total += len(source.insert(table, batch))
+    return total
+
+
+def generate(path, products=100000, recipes=20000, logs=1000000, stores=20, stores_per_product=3,
+             max_ingredients=12, log_days=90, seed=42):
+    """Write a synthetic catalog to the SQLite database in `path`. Returns the number of rows per table."""
+    rnd = random.Random(seed)
+    source = SQLiteDataSource(path)
+
+    store_rows = generate_stores(rnd, stores)
+    product_rows = generate_products(rnd, products)
+    recipe_rows, ingredient_rows = generate_recipes(rnd, recipes, product_rows, max_ingredients)
+
+    return {
+        "stores": insert_all(source, "stores", store_rows),
+        "products": insert_all(source, "products", product_rows),
+        "locations": insert_all(source, "locations", generate_locations(rnd, product_rows, store_rows, stores_per_product)),
+        "recipes": insert_all(source, "recipes", recipe_rows),
+        "recipe_ingredients": insert_all(source, "recipe_ingredients", ingredient_rows),
+        "search_logs": insert_all(source, "search_logs", generate_logs(rnd, logs, product_rows, log_days))
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--path", default="bench.db", help="SQLite database to create (must not exist)")
+    parser.add_argument("--products", type=int, default=100000)
+    parser.add_argument("--recipes", type=int, default=20000)
+    parser.add_argument("--logs", type=int, default=1000000)
+    parser.add_argument("--stores", type=int, default=20)
+    parser.add_argument("--stores-per-product", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    if os.path.exists(args.path):
+        parser.error(f"{args.path} already exists")
+
+    started = time.perf_counter()
+    counts = generate(args.path, args.products, args.recipes, args.logs, args.stores,
+                      args.stores_per_product, seed=args.seed)
+    for table, count in counts.items():
+        print(f"{table:20} {count:>10}")
+    print(f"generated in {time.perf_counter() - started:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,368 @@
+import hashlib
+import heapq
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class SnapshotCache:
+    """
+    Keeps an immutable snapshot produced by a loader function in memory.
+
+    The first access loads the snapshot synchronously. Once the TTL has
+    expired the current snapshot keeps being served while a background
+    thread builds its replacement, which is then swapped in with a single
+    reference assignment, so readers never see a half-built snapshot.
+    Readers of a loaded snapshot never wait for a lock held by a load.
+
+    With a `fingerprint` a reloaded snapshot equal to the current one is
+    discarded and the version is kept. A cache with a `source` is derived
+    from the snapshot of another cache: its loader is called with that
+    snapshot, and it is rebuilt only when the source version changes.
+    """
+
+    def __init__(self, name: str, loader: Callable[..., Any], ttl: float = 0,
+                 fingerprint: Optional[Callable[[Any], Hashable]] = None, source: Optional["SnapshotCache"] = None):
+        """
+        Args:
+            name: Name used in log messages
+            loader: Function that builds a new snapshot, from the source snapshot if `source` is given
+            ttl: Seconds after which the snapshot is refreshed (0 = never); ignored with a `source`
+            fingerprint: Function identifying the data of a snapshot, to detect unchanged reloads
+            source: Cache the snapshot is derived from
+        """
+        self.name = name
+        self.loader = loader
+        self.ttl = 0 if source is not None else ttl
+        self.fingerprint = fingerprint
+        self.source = source
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self._snapshot = None
+        self._loaded_at = 0.0
+        self._fingerprint = None
+        # Version of the source snapshot the current snapshot was built from
+        self._source_version = None
+        # Serializes the loads; only taken by readers while there is no snapshot yet
+        self._load_lock = threading.Lock()
+        # Held by the background refresh thread while it runs
+        self._refresh_lock = threading.Lock()
+        self._swap_lock = threading.Lock()
+
+    def get(self):
+        """Return the current snapshot, loading it on first use."""
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._load_lock:
+                if self._snapshot is None:
+                    self.misses += 1
+                    self._swap(*self._load())
+                return self._snapshot
+
+        self.hits += 1
+        if self.source is not None:
+            if self.source.versioned()[1] != self._source_version:
+                self._refresh_in_background()
+        elif self.ttl and time.monotonic() - self._loaded_at > self.ttl:
+            self._refresh_in_background()
+        return snapshot
+
+    def versioned(self):
+        """Return the current snapshot and its version, loading it on first use."""
+        self.get()
+        with self._swap_lock:
+            return self._snapshot, self.version
+
+    @property
+    def current(self):
+        """The current snapshot, or None if it has not been loaded yet; never triggers a load."""
+        return self._snapshot
+
+    @property
+    def age(self) -> float:
+        """Seconds since the current snapshot was loaded."""
+        return time.monotonic() - self._loaded_at if self._snapshot is not None else 0.0
+
+    def reload(self):
+        """Rebuild the snapshot synchronously and swap it in; readers keep getting the old one meanwhile."""
+        with self._load_lock:
+            self._swap(*self._load())
+            return self._snapshot
+
+    def _load(self):
+        """Build a new snapshot; returns it with the version of the source snapshot it was built from."""
+        if self.source is None:
+            return self.loader(), None
+        source_snapshot, source_version = self.source.versioned()
+        return self.loader(source_snapshot), source_version
+
+    def _swap(self, snapshot, source_version=None):
+        fingerprint = self.fingerprint(snapshot) if self.fingerprint else None
+        with self._swap_lock:
+            self._loaded_at = time.monotonic()
+            self._source_version = source_version
+            if self._snapshot is not None and fingerprint is not None and fingerprint == self._fingerprint:
+                logger.info(f"SnapshotCache: {self.name} snapshot unchanged (version {self.version})")
+                return
+            self._snapshot = snapshot
+            self._fingerprint = fingerprint
+            self.version += 1
+        logger.info(f"SnapshotCache: {self.name} snapshot loaded (version {self.version})")
+
+    def _refresh_in_background(self):
+        # Non-blocking: a reader never waits for a refresh already running
+        if not self._refresh_lock.acquire(blocking=False):
+            return
+        try:
+            threading.Thread(target=self._refresh, name=f"{self.name}-refresh", daemon=True).start()
+        except Exception:
+            self._refresh_lock.release()
+            raise
+
+    def _refresh(self):
+        try:
+            self.reload()
+        except Exception as e:
+            # Keep serving the old snapshot and retry after another TTL
+            logger.error(f"SnapshotCache: failed to refresh {self.name} snapshot: {str(e)}")
+            self._loaded_at = time.monotonic()
+        finally:
+            self._refresh_lock.release()
+
+
+def rows_fingerprint(*tables: List[Dict[str, Any]]) -> str:
+    """Digest of the rows of some tables, equal for equal rows read in the same order."""
+    digest = hashlib.sha1()
+    for rows in tables:
+        digest.update(repr(rows).encode())
+    return digest.hexdigest()
+
+
+class TableSnapshot:
+    """Read-only copy of the rows of some tables, e.g. the source of derived indexes."""
+
+    def __init__(self, **tables: List[Dict[str, Any]]):
+        self.tables = tables
+
+    def __getattr__(self, table: str) -> List[Dict[str, Any]]:
+        try:
+            return self.__dict__["tables"][table]
+        except KeyError:
+            raise AttributeError(table)
+
+    def counts(self) -> Dict[str, int]:
+        return {table: len(rows) for table, rows in self.tables.items()}
+
+    def fingerprint(self) -> str:
+        return rows_fingerprint(*self.tables.values())
+
+
+class CatalogSnapshot:
+    """
+    Read-only copy of the products, locations and stores tables.
+
+    Rows are indexed by products.id, locations.product_id,
+    locations.store_id and stores.id, and `select` answers the same
+    filters as `get_data_async` without leaving the process.
+    """
+
+    tables = ("products", "locations", "stores")
+
+    def __init__(self, products: List[Dict[str, Any]], locations: List[Dict[str, Any]], stores: List[Dict[str, Any]],
+                 transform: Optional[Callable[[Dict[str, Any], str], Dict[str, Any]]] = None):
+        """
+        Args:
+            products, locations, stores: Rows of the three tables
+            transform: Optional row transformation (product_api.transform_data); when
+                given, the denormalized product cards are built with it, see ProductCards
+        """
+        self.products = {product["id"]: product for product in products}
+        self.stores = {store["id"]: store for store in stores}
+        self.locations = locations
+        self.locations_by_product: Dict[str, List[Dict[str, Any]]] = {}
+        self.locations_by_store: Dict[str, List[Dict[str, Any]]] = {}
+        for location in locations:
+            self.locations_by_product.setdefault(location["product_id"], []).append(location)
+            self.locations_by_store.setdefault(location["store_id"], []).append(location)
+        self.store_index = StoreIndex(locations)
+        self.cards = ProductCards(self, transform) if transform else None
+
+    def counts(self) -> Dict[str, int]:
+        counts = {
+            "products": len(self.products),
+            "locations": len(self.locations),
+            "stores": len(self.stores)
+        }
+        if self.cards is not None:
+            counts["product_cards"] = len(self.cards)
+        return counts
+
+    def fingerprint(self) -> str:
+        return rows_fingerprint(list(self.products.values()), self.locations, list(self.stores.values()))
+
+    def select(self, table: str, filters: Optional[Dict[str, Any]] = None, columns: str = "*",
+               order_by: Optional[List[str]] = None, descending: bool = False,
+               limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Return copies of the rows of `table` matching `filters`.
+
+        Rows are copied because callers transform them in place. Like the
+        database, rows can be ordered, limited and projected on `columns`.
+        """
+        filters = filters or {}
+        rows = [row for row in self._candidates(table, filters) if matches_filters(row, filters)]
+
+        if order_by:
+            key = lambda row: tuple(row.get(column) for column in order_by)
+            if limit is not None:
+                rows = (heapq.nlargest if descending else heapq.nsmallest)(limit, rows, key=key)
+            else:
+                rows = sorted(rows, key=key, reverse=descending)
+        if limit is not None:
+            rows = rows[:limit]
+
+        if columns != "*":
+            selected = [column.strip() for column in columns.split(",")]
+            return [{column: row.get(column) for column in selected} for row in rows]
+        return [dict(row) for row in rows]
+
+    def _candidates(self, table, filters):
+        """Narrow the rows to scan using the indexes on id, product_id and store_id."""
+        eq = filters.get("eq", {})
+        in_ = filters.get("in", {})
+
+        if table == "products":
+            return self._lookup(self.products, eq, in_, "id", list(self.products.values()))
+        if table == "stores":
+            return self._lookup(self.stores, eq, in_, "id", list(self.stores.values()))
+        if table == "locations":
+            if "product_id" in eq or "product_id" in in_:
+                return self._lookup_many(self.locations_by_product, eq, in_, "product_id")
+            if "store_id" in eq or "store_id" in in_:
+                return self._lookup_many(self.locations_by_store, eq, in_, "store_id")
+            return self.locations
+        return []
+
+    @staticmethod
+    def _lookup(index, eq, in_, field, all_rows):
+        if field in eq:
+            row = index.get(eq[field])
+            return [row] if row else []
+        if field in in_:
+            return [index[key] for key in dict.fromkeys(in_[field]) if key in index]
+        return all_rows
+
+    @staticmethod
+    def _lookup_many(index, eq, in_, field):
+        keys = [eq[field]] if field in eq else dict.fromkeys(in_[field])
+        return [row for key in keys for row in index.get(key, [])]
+
+
+class StoreIndex:
+    """
+    Per-store index of the stocked products, built from the product_id and
+    store_id columns of the locations, so store-scoped searches only look
+    at the products of the requested stores.
+    """
+
+    def __init__(self, locations: List[Dict[str, Any]]):
+        self.products_by_store: Dict[str, Set[str]] = {}
+        for location in locations:
+            self.products_by_store.setdefault(location["store_id"], set()).add(location["product_id"])
+
+    def counts(self) -> Dict[str, int]:
+        return {
+            "stores": len(self.products_by_store),
+            "locations": sum(len(products) for products in self.products_by_store.values())
+        }
+
+    def product_ids(self, store_ids: List[str]) -> Set[str]:
+        """Ids of the products stocked in at least one of `store_ids`."""
+        products: Set[str] = set()
+        for store_id in store_ids:
+            products |= self.products_by_store.get(store_id, set())
+        return products
+
+
+class ProductCards:
+    """
+    Denormalized product cards: the transformed product, location and store
+    of every location of a product, keyed by (product id, store id).
+
+    Cards are built once per catalog snapshot, so they are rebuilt whenever
+    any of the three tables is reloaded. Each product, location and store
+    is transformed once and shared by all the cards referencing it, so
+    callers get shallow copies and must not modify the nested dicts.
+    """
+
+    def __init__(self, snapshot: CatalogSnapshot, transform: Callable[[Dict[str, Any], str], Dict[str, Any]]):
+        stores = {store_id: transform(dict(store), "store") for store_id, store in snapshot.stores.items()}
+        self.by_location: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        # Card of the first location of each product, the one the endpoints show
+        self.by_product: Dict[str, Dict[str, Any]] = {}
+
+        for product_id, product in snapshot.products.items():
+            product_card = transform(dict(product), "product")
+            for location in snapshot.locations_by_product.get(product_id, []):
+                card = {
+                    "product": product_card,
+                    "location": transform(dict(location), "location"),
+                    "store": stores.get(location["store_id"])
+                }
+                self.by_location[(product_id, location["store_id"])] = card
+                self.by_product.setdefault(product_id, card)
+            self.by_product.setdefault(product_id, {"product": product_card, "location": None, "store": None})
+
+    def __len__(self) -> int:
+        return len(self.by_location)
+
+    def get(self, product_id: str, store_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Card of a product, or None if unknown. Without `store_id` the card
+        of its first location (or without location); with `store_id` the
+        card of its location in that store.
+        """
+        card = self.by_product.get(product_id) if store_id is None else self.by_location.get((product_id, store_id))
+        return dict(card) if card else None
+
+
+def matches_filters(row: Dict[str, Any], filters: Dict[str, Any]) -> bool:
+    """Evaluate get_data_async style filters against a single row."""
+    for key, value in filters.items():
+        if key == "ilike":
+            for field, term in value.items():
+                if str(term).lower() not in str(row.get(field) or "").lower():
+                    return False
+        elif key == "eq":
+            for field, term in value.items():
+                if row.get(field) != term:
+                    return False
+        elif key == "in":
+            for field, terms in value.items():
+                if row.get(field) not in set(terms):
+                    return False
+        elif key == "contains":
+            for field, terms in value.items():
+                if not all(term in (row.get(field) or []) for term in terms):
+                    return False
+        elif key in ("lt", "gt"):
+            for field, term in value.items():
+                if row.get(field) is None or not compare(row[field], term, key):
+                    return False
+        elif key in ("before", "after"):
+            # Keyset condition: (column1, column2, ...) < or > (value1, value2, ...)
+            if any(row.get(field) is None for field in value):
+                return False
+            if not compare(tuple(row[field] for field in value), tuple(value.values()), "lt" if key == "before" else "gt"):
+                return False
+    return True
+
+
+def compare(left, right, operator: str) -> bool:
+    """Evaluate `left < right` or `left > right`."""
+    return left < right if operator == "lt" else left > right
@@ -0,0 +1,80 @@
+import re
+import unicodedata
+from typing import Any, Dict, List, Set, Tuple
+
+# Words this short ("al", "di", ...) are ignored unless the query has nothing else
+MIN_WORD_LENGTH = 3
+
+
+def normalize(text: str) -> str:
+    """Lowercase `text` and strip accents, so "Tiramisù" matches "tiramisu"."""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def words(text: str) -> List[str]:
+    """Split `text` into normalized words, dropping the very short ones when possible."""
+    all_words = re.findall(r"\w+", normalize(text))
+    long_words = [word for word in all_words if len(word) >= MIN_WORD_LENGTH]
+    return long_words or all_words
+
+
+def trigrams(text: str) -> Set[str]:
+    """Character trigrams of every word, padded like pg_trgm ("  w", " wo", ..., "rd ")."""
+    result = set()
+    for word in words(text):
+        padded = f"  {word} "
+        result.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return result
+
+
+class TrigramIndex:
+    """
+    In-memory character trigram index over one text field of a list of records.
+
+    The similarity of a record is the share of the query trigrams found in
+    its text, so a misspelled word ("lasagnie", "carbonnara") still matches
+    a longer name containing the right one. Records with the same
+    similarity are ordered by how close their whole text is to the query.
+    """
+
+    def __init__(self, records: List[Dict[str, Any]], text_field: str = "name"):
+        self.records = records
+        self.sizes: List[int] = []
+        self.postings: Dict[str, List[int]] = {}
+        for position, record in enumerate(records):
+            record_trigrams = trigrams(record.get(text_field) or "")
+            self.sizes.append(len(record_trigrams))
+            for trigram in record_trigrams:
+                self.postings.setdefault(trigram, []).append(position)
+
+    def counts(self) -> Dict[str, int]:
+        return {"records": len(self.records), "trigrams": len(self.postings)}
+
+    def search(self, term: str, limit: int = 20, min_score: float = 0.4) -> List[Tuple[Dict[str, Any], float]]:
+        """
+        Return up to `limit` (record copy, similarity) pairs, best first.
+
+        Args:
+            term: Text to look for
+            limit: Maximum number of results
+            min_score: Minimum similarity, between 0 and 1
+        """
+        query_trigrams = trigrams(term)
+        if not query_trigrams:
+            return []
+
+        shared: Dict[int, int] = {}
+        for trigram in query_trigrams:
+            for position in self.postings.get(trigram, ()):
+                shared[position] = shared.get(position, 0) + 1
+
+        matches = []
+        for position, count in shared.items():
+            similarity = count / len(query_trigrams)
+            if similarity >= min_score:
+                dice = 2 * count / (len(query_trigrams) + self.sizes[position])
+                matches.append((similarity, dice, position))
+
+        matches.sort(key=lambda match: (-match[0], -match[1], match[2]))
+        return [(dict(self.records[position]), similarity) for similarity, _, position in matches[:limit]]
@@ -0,0 +1,139 @@
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Set
+
+import numpy as np
+
+# Weights of the ranking score: share of the recipe covered by the user's
+# ingredients and share of the user's ingredients used by the recipe
+COVERAGE_WEIGHT = 0.6
+USAGE_WEIGHT = 0.4
+
+
+class IngredientIndex:
+    """
+    In-memory inverted index over the recipe_ingredients table.
+
+    Keeps a product_id -> recipe ids map and a recipe_id -> ingredient set
+    map, so recipe lookups by ingredient are answered with set operations
+    instead of one recipe_ingredients query per recipe.
+    """
+
+    def __init__(self, recipes: List[Dict[str, Any]], recipe_ingredients: List[Dict[str, Any]]):
+        # Recipes keep the order they were loaded in, which is used to break ties
+        self.recipes = {recipe["id"]: recipe for recipe in recipes}
+        self.positions = {recipe_id: position for position, recipe_id in enumerate(self.recipes)}
+
+        ingredients: Dict[str, Set[str]] = {}
+        self.recipes_by_product: Dict[str, Set[str]] = {}
+        for row in recipe_ingredients:
+            if row["recipe_id"] not in self.recipes:
+                continue
+            ingredients.setdefault(row["recipe_id"], set()).add(row["product_id"])
+            self.recipes_by_product.setdefault(row["product_id"], set()).add(row["recipe_id"])
+
+        self.ingredients: Dict[str, FrozenSet[str]] = {
+            recipe_id: frozenset(product_ids) for recipe_id, product_ids in ingredients.items()
+        }
+
+        self._build_incidence_matrix()
+
+    def _build_incidence_matrix(self):
+        """
+        Build the recipe x product incidence matrix in CSR form.
+
+        Row r holds the product columns of recipe r (in load order), so
+        scoring a set of products is a single sparse matrix-vector product.
+        """
+        self.recipe_ids = list(self.recipes)
+        self.product_columns = {product_id: column for column, product_id in enumerate(self.recipes_by_product)}
+
+        sizes = np.array([len(self.ingredients.get(recipe_id, ())) for recipe_id in self.recipe_ids], dtype=np.int64)
+        self.recipe_sizes = sizes
+        self.entry_rows = np.repeat(np.arange(len(self.recipe_ids), dtype=np.int32), sizes)
+        self.entry_columns = np.fromiter(
+            (self.product_columns[product_id]
+             for recipe_id in self.recipe_ids
+             for product_id in self.ingredients.get(recipe_id, ())),
+            dtype=np.int32,
+            count=int(sizes.sum())
+        )
+
+    def counts(self) -> Dict[str, int]:
+        return {
+            "recipes": len(self.recipes),
+            "products": len(self.recipes_by_product),
+            "recipe_ingredients": sum(len(product_ids) for product_ids in self.ingredients.values())
+        }
+
+    def recipes_using(self, product_id: str) -> List[Dict[str, Any]]:
+        """Return copies of the recipes that use `product_id`, in load order."""
+        recipe_ids = sorted(self.recipes_by_product.get(product_id, ()), key=self.positions.__getitem__)
+        return [dict(self.recipes[recipe_id]) for recipe_id in recipe_ids]
+
+    def match_counts(self, product_ids: Iterable[str]) -> Dict[str, int]:
+        """Count, for every recipe, how many of `product_ids` it uses."""
+        counts: Dict[str, int] = {}
+        for product_id in set(product_ids):
+            for recipe_id in self.recipes_by_product.get(product_id, ()):
+                counts[recipe_id] = counts.get(recipe_id, 0) + 1
+        return counts
+
+    def best_recipe(self, product_ids: Iterable[str]) -> Optional[Dict[str, Any]]:
+        """
+        Return a copy of the recipe using the most of `product_ids`.
+
+        Ties go to the recipe loaded first, or None if nothing matches.
+        """
+        counts = self.match_counts(product_ids)
+        if not counts:
+            return None
+
+        best_id = min(counts, key=lambda recipe_id: (-counts[recipe_id], self.positions[recipe_id]))
+        return dict(self.recipes[best_id])
+
+    def rank(self, product_ids: Iterable[str], k: int = 5) -> List[Dict[str, Any]]:
+        """
+        Rank recipes by how well they match `product_ids`.
+
+        Every recipe gets the number of matched ingredients, the coverage
+        of the recipe (matched / recipe size) and the usage of the user's
+        ingredients (matched / number of products given). The score is a
+        weighted sum of coverage and usage; ties are broken by matched count
+        and then by load order, so results are deterministic.
+
+        Returns:
+            Up to `k` dicts with the recipe copy and its scores, best first.
+        """
+        columns = [self.product_columns[product_id] for product_id in set(product_ids) if product_id in self.product_columns]
+        n_products = len(set(product_ids))
+        if not columns or k <= 0:
+            return []
+
+        selected = np.zeros(len(self.product_columns), dtype=bool)
+        selected[columns] = True
+
+        # Sparse matrix-vector product over the whole matrix: matched[r] is the
+        # number of non-zero entries of row r falling on a selected column
+        hits = np.flatnonzero(selected[self.entry_columns])
+        candidates, matched = np.unique(self.entry_rows[hits], return_counts=True)
+        coverage = matched / self.recipe_sizes[candidates]
+        usage = matched / n_products
+        scores = COVERAGE_WEIGHT * coverage + USAGE_WEIGHT * usage
+
+        # Keep everything scoring at least as much as the k-th best, then order that small set exactly
+        if len(candidates) > k:
+            threshold = np.partition(scores, len(scores) - k)[len(scores) - k]
+            keep = np.flatnonzero(scores >= threshold)
+        else:
+            keep = np.arange(len(candidates))
+        order = keep[np.lexsort((candidates[keep], -matched[keep], -scores[keep]))][:k]
+
+        return [
+            {
+                "recipe": dict(self.recipes[self.recipe_ids[candidates[i]]]),
+                "matched_count": int(matched[i]),
+                "coverage": float(coverage[i]),
+                "ingredient_usage": float(usage[i]),
+                "score": float(scores[i])
+            }
+            for i in order
+        ]
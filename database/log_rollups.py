@@ -0,0 +1,258 @@
+import threading
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, Optional, Set
+
+# Search types counted in the product term rankings
+PRODUCT_SEARCH_TYPES = ("product", "product_advanced")
+# Placeholder terms logged when no search term was given
+IGNORED_TERMS = ("all", "advanced_search")
+# Number of terms in the top lists
+TOP_TERMS = 10
+# History logs added to the daily counters at a time
+HISTORY_BATCH_SIZE = 1000
+
+
+class DailyRollup:
+    """Search log counters for a single day."""
+
+    def __init__(self):
+        self.total = 0
+        self.success = 0
+        self.search_types: Dict[str, int] = {}
+        # term -> [total, found] for product searches
+        self.product_terms: Dict[str, list] = {}
+        self.not_found_terms: Dict[str, int] = {}
+
+    def add(self, search_type: str, query_term: str, found: bool):
+        self.total += 1
+        if found:
+            self.success += 1
+        self.search_types[search_type] = self.search_types.get(search_type, 0) + 1
+
+        if search_type not in PRODUCT_SEARCH_TYPES or query_term in IGNORED_TERMS:
+            return
+
+        counts = self.product_terms.setdefault(query_term, [0, 0])
+        counts[0] += 1
+        if found:
+            counts[1] += 1
+        else:
+            self.not_found_terms[query_term] = self.not_found_terms.get(query_term, 0) + 1
+
+
+def counts_product_term(search_type: str, query_term: str) -> bool:
+    return search_type in PRODUCT_SEARCH_TYPES and query_term not in IGNORED_TERMS
+
+
+class TopTerms:
+    """
+    The `size` terms with the highest count, ties by term, kept up to date
+    as the counts grow. Counts never decrease, so a term only enters the
+    top by overtaking its last term.
+    """
+
+    def __init__(self, count: Callable[[str], int], size: int = TOP_TERMS):
+        self.count = count
+        self.size = size
+        self.terms: Set[str] = set()
+
+    def update(self, term: str):
+        """Account for a grown count of `term`."""
+        if term in self.terms:
+            return
+        if len(self.terms) < self.size:
+            self.terms.add(term)
+            return
+        last = max(self.terms, key=self._key)
+        if self._key(term) < self._key(last):
+            self.terms.remove(last)
+            self.terms.add(term)
+
+    def rebuild(self, terms: Iterable[str]):
+        self.terms = set(sorted(terms, key=self._key)[:self.size])
+
+    def ranked(self):
+        return sorted(self.terms, key=self._key)
+
+    def _key(self, term: str):
+        return -self.count(term), term
+
+
+class MergedRollup(DailyRollup):
+    """
+    Counters of all the days from `first_day` on (all of them if None),
+    with their daily totals and top terms, updated log by log.
+    """
+
+    def __init__(self, first_day: Optional[str] = None):
+        super().__init__()
+        self.first_day = first_day
+        # day -> [total, success]
+        self.daily: Dict[str, list] = {}
+        self.top_products = TopTerms(lambda term: self.product_terms[term][0])
+        self.top_not_found = TopTerms(lambda term: self.not_found_terms[term])
+
+    def covers(self, day: str) -> bool:
+        return self.first_day is None or day >= self.first_day
+
+    def add_log(self, day: str, search_type: str, query_term: str, found: bool):
+        self.add(search_type, query_term, found)
+        daily = self.daily.setdefault(day, [0, 0])
+        daily[0] += 1
+        if found:
+            daily[1] += 1
+
+        if counts_product_term(search_type, query_term):
+            self.top_products.update(query_term)
+            if not found:
+                self.top_not_found.update(query_term)
+
+    def merge(self, days: Dict[str, DailyRollup]):
+        """Add the counters of the covered `days`; the top terms are recomputed."""
+        for day, rollup in days.items():
+            if not self.covers(day):
+                continue
+            self.total += rollup.total
+            self.success += rollup.success
+            daily = self.daily.setdefault(day, [0, 0])
+            daily[0] += rollup.total
+            daily[1] += rollup.success
+            for search_type, count in rollup.search_types.items():
+                self.search_types[search_type] = self.search_types.get(search_type, 0) + count
+            for term, (total, found) in rollup.product_terms.items():
+                counts = self.product_terms.setdefault(term, [0, 0])
+                counts[0] += total
+                counts[1] += found
+            for term, count in rollup.not_found_terms.items():
+                self.not_found_terms[term] = self.not_found_terms.get(term, 0) + count
+
+        self.top_products.rebuild(self.product_terms)
+        self.top_not_found.rebuild(self.not_found_terms)
+
+    def stats(self) -> Dict[str, Any]:
+        """The counters in the /logs/stats format."""
+        return {
+            "total_searches": self.total,
+            "successful_searches": self.success,
+            "failed_searches": self.total - self.success,
+            "search_types": dict(self.search_types),
+            "top_products": [
+                {
+                    "term": term,
+                    "count": self.product_terms[term][0],
+                    "found_percent": (self.product_terms[term][1] / self.product_terms[term][0]) * 100
+                }
+                for term in self.top_products.ranked()
+            ],
+            "top_not_found": [{"term": term, "count": self.not_found_terms[term]} for term in self.top_not_found.ranked()],
+            "daily_stats": {
+                day: {"total": total, "success": success, "failed": total - success}
+                for day, (total, success) in sorted(self.daily.items())
+            }
+        }
+
+
+class SearchLogRollups:
+    """
+    Incrementally maintained aggregates of the search_logs table.
+
+    Counters are kept per day, and the merged counters of every window of
+    days asked for (and of all of them) are kept up to date as logs are
+    added, so /logs/stats never rescans the logs nor the days.
+
+    History is read once, lazily, through `loader`, which must return the
+    logs written before `cutoff`; every log written from then on is added
+    with `add`, so no log is counted twice.
+
+    The rollups live in the process: with several workers each one only
+    adds the logs it wrote itself after reading the history, so the
+    statistics are approximate and best served by a single worker.
+    """
+
+    def __init__(self, loader: Callable[[datetime], Iterable[Dict[str, Any]]], cutoff: Optional[datetime] = None):
+        """
+        Args:
+            loader: Function returning the logs with a timestamp before the given cutoff
+            cutoff: Boundary between loaded history and incremental updates
+        """
+        self.loader = loader
+        self.cutoff = cutoff or datetime.now()
+        self._days: Dict[str, DailyRollup] = {}
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._loaded = False
+        self._all = MergedRollup()
+        # (days, today) -> merged counters of that window
+        self._windows: Dict[tuple, MergedRollup] = {}
+
+    def add(self, log: Dict[str, Any]):
+        """Add a single search log to the aggregates."""
+        self.add_many([log])
+
+    def add_many(self, logs: Iterable[Dict[str, Any]], merged: bool = True):
+        """Add search logs, e.g. a batch just written, to the aggregates."""
+        with self._lock:
+            for log in logs:
+                day = log_date(log["timestamp"])
+                if day not in self._days:
+                    self._days[day] = DailyRollup()
+                self._days[day].add(log["search_type"], log["query_term"], log["found"])
+                if not merged:
+                    continue
+                self._all.add_log(day, log["search_type"], log["query_term"], log["found"])
+                for window in self._windows.values():
+                    if window.covers(day):
+                        window.add_log(day, log["search_type"], log["query_term"], log["found"])
+
+    def stats(self, days: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Return the aggregated statistics, in the /logs/stats format.
+
+        Args:
+            days: Only include the last `days` days (today included), or everything if None
+        """
+        self.load()
+
+        with self._lock:
+            if days is None:
+                return self._all.stats()
+
+            today = date.today()
+            key = (days, today)
+            if key not in self._windows:
+                # Windows of previous days are not updated anymore
+                self._windows = {window_key: window for window_key, window in self._windows.items() if window_key[1] == today}
+                window = MergedRollup((today - timedelta(days=days - 1)).isoformat())
+                window.merge(self._days)
+                self._windows[key] = window
+            return self._windows[key].stats()
+
+    def load(self):
+        """
+        Read the history through the loader, once.
+
+        New logs can still be added while the history is being read.
+        """
+        with self._load_lock:
+            if not self._loaded:
+                # Only the daily counters are updated while reading, the merged ones are rebuilt once at the end
+                batch = []
+                for log in self.loader(self.cutoff):
+                    batch.append(log)
+                    if len(batch) == HISTORY_BATCH_SIZE:
+                        self.add_many(batch, merged=False)
+                        batch = []
+                self.add_many(batch, merged=False)
+
+                with self._lock:
+                    self._all = MergedRollup()
+                    self._all.merge(self._days)
+                    self._windows = {}
+                self._loaded = True
+
+
+def log_date(timestamp) -> str:
+    """Extract the YYYY-MM-DD day of a log timestamp."""
+    if isinstance(timestamp, str):
+        return timestamp.split("T")[0]
+    return timestamp.strftime("%Y-%m-%d")
@@ -0,0 +1,194 @@
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Maximum 2-opt passes over the route; each one is O(n^2) and the first few give nearly all the gain
+MAX_TWO_OPT_PASSES = 5
+
+
+def aisle_number(aisle: Any) -> Optional[float]:
+    """Numeric value of an aisle label ("3" -> 3.0), or None for other labels."""
+    try:
+        return float(aisle)
+    except (TypeError, ValueError):
+        return None
+
+
+def store_aisles(store: Dict[str, Any]) -> int:
+    """
+    Number of aisles of a store row, flat ("aisles") or transformed
+    ("layout": {"aisles": ...}). Stores without a usable count are logged
+    and get 0: only the aisles of their locations are walked.
+    """
+    layout = store.get("layout")
+    aisles = store["aisles"] if "aisles" in store else layout.get("aisles") if isinstance(layout, dict) else None
+    try:
+        return int(aisles)
+    except (TypeError, ValueError):
+        logger.warning(f"RouteGraphs: store {store.get('id')} has no usable aisle count ({aisles!r}), "
+                       f"routing through the aisles of its locations only")
+        return 0
+
+
+class StoreRouteGraph:
+    """
+    Walking distances inside one store, for ordering a pick list.
+
+    The store is modelled as parallel aisles joined by a front and a back
+    cross aisle. Every aisle has a node at each end; the shortest distances
+    between all the nodes are computed once (Floyd-Warshall), so the distance
+    between two shelves only takes the best of the four combinations of
+    the ends of their aisles.
+
+    Aisles are placed at the median x of their locations. Numbered aisles of
+    `stores.aisles` without locations are interpolated, so they can still
+    be walked through.
+    """
+
+    def __init__(self, locations: List[Dict[str, Any]], aisles: int = 0):
+        self.locations = {location["product_id"]: location for location in locations}
+
+        xs_by_aisle: Dict[str, List[float]] = {}
+        for location in locations:
+            xs_by_aisle.setdefault(str(location.get("aisle")), []).append(float(location.get("x_coordinate") or 0))
+        positions = {aisle: float(np.median(xs)) for aisle, xs in xs_by_aisle.items()}
+
+        numbered = sorted((aisle_number(aisle), x) for aisle, x in positions.items() if aisle_number(aisle) is not None)
+        if numbered:
+            for number in range(1, aisles + 1):
+                if str(number) not in positions:
+                    positions[str(number)] = float(np.interp(number, [n for n, _ in numbered], [x for _, x in numbered]))
+
+        self.aisles = sorted(positions, key=lambda aisle: (positions[aisle], aisle))
+        self.aisle_index = {aisle: index for index, aisle in enumerate(self.aisles)}
+        self.aisle_x = np.array([positions[aisle] for aisle in self.aisles], dtype=np.float64)
+
+        ys = [float(location.get("y_coordinate") or 0) for location in locations]
+        self.front_y = min(ys, default=0.0) - 1
+        self.back_y = max(ys, default=0.0) + 1
+        self.distances = self._node_distances()
+
+    def _node_distances(self) -> np.ndarray:
+        """Shortest distances between the aisle ends: node 2*i is the front of aisle i, 2*i+1 its back."""
+        count = 2 * len(self.aisles)
+        distances = np.full((count, count), np.inf)
+        np.fill_diagonal(distances, 0)
+        for index in range(len(self.aisles)):
+            front, back = 2 * index, 2 * index + 1
+            distances[front, back] = distances[back, front] = self.back_y - self.front_y
+            if index + 1 < len(self.aisles):
+                step = self.aisle_x[index + 1] - self.aisle_x[index]
+                for end in (0, 1):
+                    distances[front + end, front + 2 + end] = distances[front + 2 + end, front + end] = step
+
+        for middle in range(count):
+            distances = np.minimum(distances, distances[:, middle, None] + distances[None, middle, :])
+        return distances
+
+    def point_distances(self, points: List[Tuple[Optional[str], float, float]]) -> np.ndarray:
+        """
+        Walking distance matrix between (aisle, x, y) points. Points whose
+        aisle is unknown are placed in the aisle nearest to their x.
+        """
+        if not self.aisles:
+            coordinates = np.array([(x, y) for _, x, y in points], dtype=np.float64).reshape(-1, 2)
+            return np.abs(coordinates[:, None, :] - coordinates[None, :, :]).sum(axis=2)
+
+        aisles = np.array([
+            self.aisle_index[aisle] if aisle in self.aisle_index else int(np.argmin(np.abs(self.aisle_x - x)))
+            for aisle, x, _ in points
+        ], dtype=np.int64)
+        xs = np.array([x for _, x, _ in points], dtype=np.float64)
+        ys = np.array([y for _, _, y in points], dtype=np.float64)
+
+        # Distance from each point to the front and back end of its aisle
+        lateral = np.abs(xs - self.aisle_x[aisles])
+        to_end = np.stack((lateral + np.abs(ys - self.front_y), lateral + np.abs(ys - self.back_y)), axis=1)
+        nodes = np.stack((2 * aisles, 2 * aisles + 1), axis=1)
+
+        matrix = np.full((len(points), len(points)), np.inf)
+        for from_end in (0, 1):
+            for to_end_index in (0, 1):
+                via = self.distances[nodes[:, from_end, None], nodes[None, :, to_end_index]]
+                matrix = np.minimum(matrix, to_end[:, from_end, None] + via + to_end[None, :, to_end_index])
+
+        # Within the same aisle the shelves are reached directly
+        same_aisle = aisles[:, None] == aisles[None, :]
+        direct = np.abs(ys[:, None] - ys[None, :]) + np.abs(xs[:, None] - xs[None, :])
+        return np.where(same_aisle, np.minimum(matrix, direct), matrix)
+
+    def entrance(self) -> Tuple[Optional[str], float, float]:
+        """Default start of a route: the front end of the first aisle."""
+        if not self.aisles:
+            return None, 0.0, 0.0
+        return self.aisles[0], float(self.aisle_x[0]), self.front_y
+
+
+def plan_route(distances: np.ndarray) -> Tuple[List[int], List[float]]:
+    """
+    Order the points 1..n-1 of a distance matrix into a short open path
+    starting from point 0: nearest neighbour, then 2-opt until no reversal
+    of a segment shortens the path, for at most MAX_TWO_OPT_PASSES passes.
+
+    Returns:
+        The visiting order of the points (0 excluded) and the length of each leg
+    """
+    # Plain lists: element-wise numpy indexing is several times slower in the loops below
+    rows = distances.tolist()
+    count = len(rows)
+    path = [0]
+    remaining = set(range(1, count))
+    while remaining:
+        row = rows[path[-1]]
+        nearest = min(remaining, key=lambda point: (row[point], point))
+        path.append(nearest)
+        remaining.remove(nearest)
+
+    for _ in range(MAX_TWO_OPT_PASSES):
+        improved = False
+        for i in range(1, count - 1):
+            row_before = rows[path[i - 1]]
+            first = path[i]
+            for j in range(i + 1, count):
+                # Reverse path[i..j]; the path is open, so there is no edge after the last point
+                last = path[j]
+                if j + 1 < count:
+                    following = path[j + 1]
+                    before = row_before[first] + rows[last][following]
+                    after = row_before[last] + rows[first][following]
+                else:
+                    before = row_before[first]
+                    after = row_before[last]
+                if after < before - 1e-9:
+                    path[i:j + 1] = reversed(path[i:j + 1])
+                    first = path[i]
+                    improved = True
+        if not improved:
+            break
+
+    legs = [float(rows[path[position - 1]][path[position]]) for position in range(1, count)]
+    return path[1:], legs
+
+
+class RouteGraphs:
+    """Per-store StoreRouteGraph, built from the stores and their locations."""
+
+    def __init__(self, stores: List[Dict[str, Any]], locations: List[Dict[str, Any]]):
+        by_store: Dict[str, List[Dict[str, Any]]] = {}
+        for location in locations:
+            by_store.setdefault(location["store_id"], []).append(location)
+        aisles = {store["id"]: store_aisles(store) for store in stores}
+        self.graphs = {
+            store_id: StoreRouteGraph(store_locations, aisles.get(store_id, 0))
+            for store_id, store_locations in by_store.items()
+        }
+
+    def counts(self) -> Dict[str, int]:
+        return {"stores": len(self.graphs), "aisles": sum(len(graph.aisles) for graph in self.graphs.values())}
+
+    def get(self, store_id: str) -> Optional[StoreRouteGraph]:
+        return self.graphs.get(store_id)
@@ -1,18 +1,136 @@
 from dotenv import load_dotenv
-from fastapi import FastAPI, Query, Depends
-from typing import Dict, List, Any, Optional
+from fastapi import FastAPI, Query, Depends, Request, Response, HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import Dict, List, Any, Optional, Union, get_args, get_origin
 import uvicorn
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
 from datetime import datetime
+import asyncio
+import base64
+import functools
+import hashlib
+import json
+import logging
+import threading
+import time
 import uuid
 
-from supabase_client import supabase
+from catalog_cache import CatalogSnapshot, SnapshotCache, TableSnapshot, matches_filters
+from ingredient_index import IngredientIndex
+from metrics import CONTENT_TYPE, MetricsRegistry, RequestMetricsMiddleware
+from search_log_writer import SearchLogWriter
+from log_rollups import SearchLogRollups
+from fuzzy_index import TrigramIndex
+from product_search import BM25Index
+from recipe_cache import RecipeDetailCache
+from semantic_search import SemanticIndex, create_encoder
+from spatial_index import SpatialIndex
+from pick_route import RouteGraphs, plan_route
+from sqlite_backend import SQLiteDataSource
 import os
+
+# Optional faster JSON encoder for the large responses, see FAST_RESPONSES
+try:
+    import orjson
+except ImportError:
+    orjson = None
 load_dotenv()
 
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Backend of the data access functions: "supabase" or "sqlite" (local database in SQLITE_PATH, ":memory:" allowed)
+DATA_BACKEND = os.environ.get("DATA_BACKEND", "supabase").lower()
+SQLITE_PATH = os.environ.get("SQLITE_PATH", "market.db")
+
+# In-memory snapshot of products, locations and stores (disabled by default)
+CATALOG_CACHE_ENABLED = os.environ.get("CATALOG_CACHE_ENABLED", "false").lower() == "true"
+CATALOG_CACHE_TTL = float(os.environ.get("CATALOG_CACHE_TTL", 300))
+
+# Refresh interval of the recipe ingredient and name indexes
+INGREDIENT_INDEX_TTL = float(os.environ.get("INGREDIENT_INDEX_TTL", 300))
+
+# Assembled recipe details: maximum estimated size (0 = disabled) and seconds before an entry is rebuilt
+RECIPE_CACHE_MAX_BYTES = int(os.environ.get("RECIPE_CACHE_MAX_BYTES", 16 * 1024 * 1024))
+RECIPE_CACHE_TTL = float(os.environ.get("RECIPE_CACHE_TTL", 300))
+
+# Maximum number of ids accepted by /products/batch and of names accepted by /products/resolve
+PRODUCT_BATCH_MAX_SIZE = int(os.environ.get("PRODUCT_BATCH_MAX_SIZE", 100))
+
+# Locations read per page by /stores/{store_id}/products (at most 1000 with PostgREST defaults)
+STORE_PRODUCTS_BATCH_SIZE = int(os.environ.get("STORE_PRODUCTS_BATCH_SIZE", 500))
+
+# Values sent per IN filter, so the PostgREST GET URLs stay well below the usual 8-16 KB limits
+IN_QUERY_BATCH_SIZE = int(os.environ.get("IN_QUERY_BATCH_SIZE", 500))
+
+# Send the large search and store inventory responses without revalidating them
+# against their response model, encoded with orjson when it is installed
+FAST_RESPONSES = os.environ.get("FAST_RESPONSES", "false").lower() == "true"
+
+# Cache-Control max-age of the product and recipe detail responses, which carry an ETag
+HTTP_CACHE_MAX_AGE = int(os.environ.get("HTTP_CACHE_MAX_AGE", 60))
+
+# Ranked product search
+PRODUCT_SEARCH_LIMIT = int(os.environ.get("PRODUCT_SEARCH_LIMIT", 20))
+
+# Semantic product search: encoder ("hashed" or "module:factory"), embedding size,
+# directory where the index is persisted (empty = memory only) and partitions probed per query
+SEMANTIC_ENCODER = os.environ.get("SEMANTIC_ENCODER", "hashed")
+SEMANTIC_DIM = int(os.environ.get("SEMANTIC_DIM", 256))
+SEMANTIC_INDEX_PATH = os.environ.get("SEMANTIC_INDEX_PATH", "")
+SEMANTIC_NPROBE = int(os.environ.get("SEMANTIC_NPROBE", 32))
+# Extra candidates read when other criteria may discard some of the nearest products
+SEMANTIC_CANDIDATE_FACTOR = 5
+
+# Fuzzy recipe name search
+RECIPE_SEARCH_LIMIT = int(os.environ.get("RECIPE_SEARCH_LIMIT", 20))
+RECIPE_SEARCH_MIN_SCORE = float(os.environ.get("RECIPE_SEARCH_MIN_SCORE", 0.4))
 
-app = FastAPI(title="Product Search API")
+# Write-behind search logging
+SEARCH_LOG_BATCH_SIZE = int(os.environ.get("SEARCH_LOG_BATCH_SIZE", 100))
+SEARCH_LOG_FLUSH_INTERVAL = float(os.environ.get("SEARCH_LOG_FLUSH_INTERVAL", 2))
+SEARCH_LOG_QUEUE_SIZE = int(os.environ.get("SEARCH_LOG_QUEUE_SIZE", 10000))
+
+# Page size used when reading whole tables (PostgREST caps responses at 1000 rows by default)
+FETCH_PAGE_SIZE = int(os.environ.get("FETCH_PAGE_SIZE", 1000))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Build the in-memory snapshots in the background, so the first requests don't pay for it
+    threading.Thread(target=warm_up_snapshots, name="snapshot-warm-up", daemon=True).start()
+
+    yield
+
+    # Write the buffered search logs before shutting down
+    search_log_writer.close()
+    if DATA_BACKEND == "supabase":
+        from supabase_client import close_async_supabase
+        await close_async_supabase()
+
+app = FastAPI(title="Product Search API", lifespan=lifespan)
+
+# Prometheus metrics served by /metrics
+metrics = MetricsRegistry()
+request_duration = metrics.histogram(
+    "product_api_request_duration_seconds", "Latency of the HTTP requests by route", ["method", "route", "status"]
+)
+backend_query_duration = metrics.histogram(
+    "product_api_backend_query_duration_seconds", "Duration of the data source queries by table", ["table", "operation"]
+)
+backend_query_errors = metrics.counter(
+    "product_api_backend_query_errors_total", "Data source queries that raised an error", ["table", "operation"]
+)
+snapshot_reads = metrics.counter(
+    "product_api_snapshot_reads_total", "get_data_async calls served by the catalog snapshot by table", ["table"]
+)
+
+app.add_middleware(RequestMetricsMiddleware, histogram=request_duration)
 
 # Pydantic models for response validation
 class Attributes(BaseModel):
@@ -52,6 +170,24 @@ class ProductWithLocation(BaseModel):
     store: Optional[Store] = None
     quantity: Optional[float] = None
     unit: Optional[str] = None
+    score: Optional[float] = None # Relevance, for ranked searches
+
+class NearbyProduct(ProductWithLocation):
+    distance: float # From the query point, in store coordinates
+
+class RouteStop(ProductWithLocation):
+    distance: float # Walked from the previous stop, or from the start
+
+class PickRoute(BaseModel):
+    store_id: str
+    total_distance: float
+    stops: List[RouteStop]
+    missing: List[str] = [] # Requested products not stocked in the store
+
+class RouteRequest(BaseModel):
+    product_ids: List[str] = Field(..., min_length=1, max_length=PRODUCT_BATCH_MAX_SIZE)
+    start_x: Optional[float] = None # Start of the route, the entrance by default
+    start_y: Optional[float] = None
 
 class SearchQuery(BaseModel):
     name: Optional[str] = None
@@ -59,8 +195,13 @@ class SearchQuery(BaseModel):
     tags: Optional[List[str]] = None
     brand: Optional[str] = None
     store_id: Optional[str] = None
+    store_ids: Optional[List[str]] = None # Search several stores; a product is shown at its location in the first one stocking it
     min_weight: Optional[float] = None
     max_weight: Optional[float] = None
+    mode: Optional[str] = None # "ranked" for full-text or "semantic" for similarity search on name
+    limit: Optional[int] = Field(None, ge=1, le=100) # Maximum number of results, per page outside ranked and semantic mode
+    cursor: Optional[str] = None # X-Next-Cursor of the previous page, outside ranked and semantic mode
+    fields: Optional[str] = None # Comma-separated product fields to return, e.g. "name,attributes"
     
 class Ingredient(BaseModel):
     recipe_id: str
@@ -74,9 +215,33 @@ class Recipe(BaseModel):
     description: str
     ingredients: Optional[List[Ingredient]] = None
 
+class ProductBatchRequest(BaseModel):
+    ids: List[str] = Field(..., min_length=1, max_length=PRODUCT_BATCH_MAX_SIZE)
+
+class ProductResolveRequest(BaseModel):
+    names: List[str] = Field(..., min_length=1, max_length=PRODUCT_BATCH_MAX_SIZE)
+
+class RecipeCacheInvalidation(BaseModel):
+    recipe_ids: List[str] = []
+    product_ids: List[str] = []
+
+class ResolvedProduct(BaseModel):
+    name: str
+    product_id: Optional[str] = None # None when no product matches the name
+    product_name: Optional[str] = None
+    score: Optional[float] = None # BM25 relevance of the match
+
+class RankedRecipe(BaseModel):
+    recipe: Recipe
+    matched_count: int
+    coverage: float  # Share of the recipe ingredients among the given ones
+    ingredient_usage: float  # Share of the given ingredients used by the recipe
+    score: float
+
 class RecipeWithDetails(BaseModel):
     recipe: Recipe
     ingredients_details: Optional[List[ProductWithLocation]] = None # Include product details for each ingredient
+    score: Optional[float] = None # Name similarity, for fuzzy searches
 
 class SearchLog(BaseModel):
     id: Optional[str] = None
@@ -86,12 +251,72 @@ class SearchLog(BaseModel):
     timestamp: Optional[datetime] = None
     details: Optional[Dict[str, Any]] = None
 
+def create_data_source():
+    """
+    Create the data source selected by DATA_BACKEND.
+
+    Both expose the Supabase query builder interface (table().select()...execute()).
+    supabase_client is only imported when Supabase is used, so the SQLite
+    backend runs without any Supabase configuration.
+    """
+    if DATA_BACKEND == "sqlite":
+        logger.info(f"Using the SQLite backend: {SQLITE_PATH}")
+        return SQLiteDataSource(SQLITE_PATH)
+    if DATA_BACKEND != "supabase":
+        raise ValueError(f"Unknown DATA_BACKEND: {DATA_BACKEND}")
+
+    from supabase_client import supabase
+    return supabase
+
+active_data_source = create_data_source()
+
 # Helper function to get data source
-def get_data_source(): return supabase
+def get_data_source(): return active_data_source
+
+async def get_async_data_source():
+    """Async counterpart of get_data_source, used by the async endpoints."""
+    if DATA_BACKEND == "sqlite":
+        return active_data_source.async_client()
+
+    from supabase_client import get_async_supabase
+    return await get_async_supabase()
+
+# Number of backend round trips made while serving the current request.
+# The counter is a mutable list, so the round trips of the tasks started
+# with asyncio.gather (which run in a copy of the context) are counted too.
+backend_round_trips: ContextVar[Optional[List[int]]] = ContextVar("backend_round_trips", default=None)
+
+def reset_round_trips():
+    """Start counting the backend round trips of the current request."""
+    backend_round_trips.set([0])
+
+def count_round_trip():
+    """Record one backend round trip for the current request."""
+    counter = backend_round_trips.get()
+    if counter is not None:
+        counter[0] += 1
+
+def round_trips():
+    """Number of backend round trips made since reset_round_trips."""
+    counter = backend_round_trips.get()
+    return counter[0] if counter else 0
+
+@contextmanager
+def backend_query(table, operation="select"):
+    """Count one backend round trip and record its duration (and error, if any) in the metrics."""
+    count_round_trip()
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        backend_query_errors.inc(table, operation)
+        raise
+    finally:
+        backend_query_duration.observe(time.perf_counter() - started, table, operation)
 
 @app.get("/")
 def read_root():
-    return {"message": "Welcome to the Product Search API", "data_source": "Supabase"}
+    return {"message": "Welcome to the Product Search API", "data_source": "SQLite" if DATA_BACKEND == "sqlite" else "Supabase"}
 
 # Add this helper function to transform Supabase data to match your models
 def transform_supabase_data(data_type, data):
@@ -183,14 +408,86 @@ def transform_data(data, data_type):
     
     return data
 
-# Unified function to get data
-def get_data(table, filters=None, data_source=get_data_source()):
-    """Get data from Supabase with optional filters."""
-    if data_source is None:
-        return []   
+async def get_data_async(table, filters=None, order_by=None, descending=False, limit=None, columns="*"):
+    """
+    Get data from the catalog snapshot when enabled, otherwise from the data
+    source, with optional filters, ordering, limit and projection.
+    """
+    if catalog_cache and table in CatalogSnapshot.tables:
+        snapshot_reads.inc(table)
+        return (await get_snapshot(catalog_cache)).select(table, filters, columns, order_by, descending, limit)
+
+    return await fetch_data_async(table, filters, order_by, descending, limit, columns)
 
-    query = data_source.table(table).select("*")
-    
+async def fetch_data_async(table, filters=None, order_by=None, descending=False, limit=None, columns="*"):
+    """Get data from the data source, using the pooled async Supabase client or the SQLite backend."""
+    client = await get_async_data_source()
+
+    query = apply_filters(client.table(table).select(columns), filters)
+    for column in order_by or []:
+        query = query.order(column, desc=descending)
+    if limit is not None:
+        query = query.limit(limit)
+
+    with backend_query(table):
+        response = await query.execute()
+    return response.data
+
+async def fetch_all_data_async(table, order_by, filters=None, columns="*"):
+    """Async version of fetch_all_data: read every matching row, one FETCH_PAGE_SIZE page at a time."""
+    client = await get_async_data_source()
+
+    rows = []
+    while True:
+        query = apply_filters(client.table(table).select(columns), filters)
+        for column in order_by:
+            query = query.order(column)
+        with backend_query(table):
+            page = (await query.range(len(rows), len(rows) + FETCH_PAGE_SIZE - 1).execute()).data
+        rows.extend(page)
+        if len(page) < FETCH_PAGE_SIZE:
+            return rows
+
+async def get_data_in(table, column, values, order_by, filters=None):
+    """
+    get_data_async for the rows whose `column` is one of `values`.
+
+    The values are sent in IN filters of at most IN_QUERY_BATCH_SIZE, read
+    concurrently; the rows are returned in the order of the batches. A
+    batch can match more rows than the data source returns at once
+    (PostgREST silently stops at its max-rows), so each one is read in
+    pages ordered by `order_by`.
+    """
+    values = list(values)
+    filters = filters or {}
+
+    async def read(batch):
+        batch_filters = {**filters, "in": {**filters.get("in", {}), column: batch}}
+        if catalog_cache and table in CatalogSnapshot.tables:
+            return await get_data_async(table, batch_filters)
+        return await fetch_all_data_async(table, order_by, batch_filters)
+
+    batches = [values[start:start + IN_QUERY_BATCH_SIZE] for start in range(0, len(values), IN_QUERY_BATCH_SIZE)]
+    pages = await asyncio.gather(*map(read, batches))
+    return [row for page in pages for row in page]
+
+async def no_data():
+    """Awaitable empty result, for lookups that are skipped in asyncio.gather."""
+    return []
+
+async def get_snapshot(cache: SnapshotCache):
+    """
+    Return the current snapshot of `cache` from an async endpoint.
+
+    A snapshot that still has to be loaded is loaded in a worker thread,
+    so the event loop is never blocked by it.
+    """
+    if cache.current is not None:
+        return cache.get()
+    return await run_in_threadpool(cache.get)
+
+def apply_filters(query, filters=None):
+    """Apply get_data_async style filters to a Supabase or SQLite query."""
     if filters:
         for key, value in filters.items():
             if key == "ilike":
@@ -199,23 +496,532 @@ def get_data(table, filters=None, data_source=get_data_source()):
             elif key == "eq":
                 for field, term in value.items():
                     query = query.eq(field, term)
+            elif key == "in":
+                for field, terms in value.items():
+                    query = query.in_(field, list(terms))
+            elif key == "lt":
+                for field, term in value.items():
+                    query = query.lt(field, term)
+            elif key == "gt":
+                for field, term in value.items():
+                    query = query.gt(field, term)
+            elif key in ("before", "after"):
+                # Keyset condition: (column1, column2, ...) < or > (value1, value2, ...)
+                operator = "lt" if key == "before" else "gt"
+                values = list(value.items())
+                if len(values) == 1:
+                    query = getattr(query, operator)(*values[0])
+                else:
+                    query = query.or_(keyset_condition(values, operator))
             elif key == "contains":
                 for field, terms in value.items():
                     for term in terms:
                         query = query.contains(field, [term])
-    
-    response = query.execute()
-    return response.data
+    return query
+
+def keyset_condition(values, operator):
+    """Build the PostgREST logic tree comparing a tuple of columns with a tuple of values."""
+    column, value = values[0]
+    value = quote_value(value)
+    condition = f'{column}.{operator}.{value}'
+    if len(values) == 1:
+        return condition
+
+    rest = keyset_condition(values[1:], operator)
+    if len(values) > 2:
+        rest = f"or({rest})"
+    return f'{condition},and({column}.eq.{value},{rest})'
+
+def quote_value(value):
+    """Double-quote a value of a PostgREST logic tree, escaping backslashes and quotes, so , ( ) stay literal."""
+    return '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+def encode_cursor(values):
+    """Encode the keyset values of the last returned row as an opaque cursor."""
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+def decode_cursor(cursor, size=1):
+    """Decode a cursor produced by encode_cursor from `size` string keyset values; 400 for anything else."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list) or len(values) != size or not all(isinstance(value, str) for value in values):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+def next_cursor(rows, limit):
+    """Cursor of the page after `rows`, or None when `rows` is the last page."""
+    if limit is None or len(rows) < limit:
+        return None
+    return encode_cursor([rows[-1]["id"]])
+
+# Fields that can be requested with the fields= parameter of the list endpoints.
+# "attributes" stands for the brand, size and weight columns of products.
+PROJECTABLE_FIELDS = {
+    "products": ("id", "name", "description", "category", "tags", "attributes"),
+    "recipes": ("id", "name", "description")
+}
+FIELD_COLUMNS = {"attributes": ("brand", "size", "weight")}
+
+def parse_fields(fields, table):
+    """
+    Validate a comma-separated fields= parameter.
+
+    Returns the requested fields, always including id, or None when all
+    the fields are requested.
+    """
+    if not fields:
+        return None
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in requested if field not in PROJECTABLE_FIELDS[table]]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return list(dict.fromkeys(["id"] + requested))
+
+def select_columns(fields, extra_fields=()):
+    """Columns to read from the data source to return `fields` ("*" for all of them)."""
+    if fields is None:
+        return "*"
+    columns = []
+    for field in dict.fromkeys(list(fields) + list(extra_fields)):
+        columns.extend(FIELD_COLUMNS.get(field, (field,)))
+    return ",".join(columns)
+
+def project(data, fields):
+    """Keep only `fields` of a transformed row."""
+    if fields is None:
+        return data
+    return {field: data.get(field) for field in fields}
+
+def dumps(content):
+    """Encode `content` as compact JSON bytes, with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(content, default=jsonable_encoder, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=jsonable_encoder).encode()
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse encoded with dumps."""
+
+    def render(self, content):
+        return dumps(content)
+
+@functools.lru_cache(maxsize=None)
+def shaper(annotation):
+    """
+    Function giving a value the JSON shape `annotation` gives it as a
+    response model: only the model fields, missing optional fields as their
+    default, integers of float fields as floats. Returns None when the
+    value is sent as it is.
+    """
+    origin = get_origin(annotation)
+    if origin is Union:
+        members = [member for member in get_args(annotation) if member is not type(None)]
+        inner = shaper(members[0]) if len(members) == 1 else None
+        return None if inner is None else (lambda value: None if value is None else inner(value))
+    if origin in (list, List):
+        inner = shaper(get_args(annotation)[0]) if get_args(annotation) else None
+        return None if inner is None else (lambda value: [inner(item) for item in value])
+    if annotation is float:
+        return lambda value: float(value) if type(value) is int else value
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        fields = [
+            (name, field.get_default(call_default_factory=True), shaper(field.annotation))
+            for name, field in annotation.model_fields.items()
+        ]
+
+        def shape(value):
+            if isinstance(value, BaseModel):
+                value = value.model_dump()
+            shaped = {}
+            for name, default, convert in fields:
+                item = value.get(name, default)
+                shaped[name] = item if convert is None or item is None else convert(item)
+            return shaped
+        return shape
+    return None
+
+def shape_rows(rows, model):
+    """Rows with exactly the fields `model` would serialize, without validating them against it."""
+    return shaper(List[model])(rows)
+
+def list_response(content, response: Response, headers=None, fields=None, model=None):
+    """
+    Return a list endpoint result, rows of `model`, with `headers`.
+
+    Projected rows would not validate against the response model, so they
+    are returned as a FastJSONResponse. So is every result with
+    FAST_RESPONSES: validating the rows again against the response model
+    is the most expensive part of sending a large response, so they are
+    only shaped like the model would serialize them.
+    """
+    headers = {name: value for name, value in (headers or {}).items() if value is not None}
+    if fields is not None:
+        return FastJSONResponse(content, headers=headers)
+    if FAST_RESPONSES:
+        return FastJSONResponse(shape_rows(content, model), headers=headers)
+    response.headers.update(headers)
+    return content
+
+# Part of the version ETags, so that the ETags of a previous process never match
+ETAG_SEED = uuid.uuid4().hex[:8]
+
+async def catalog_etag():
+    """
+    ETag derived from the version of the catalog snapshot, or None when the
+    catalog cache is disabled. It changes every time the snapshot is reloaded,
+    so it can be checked before reading any data.
+    """
+    if not catalog_cache:
+        return None
+    await get_snapshot(catalog_cache)
+    return f'"{ETAG_SEED}-{catalog_cache.version}"'
+
+def content_etag(content):
+    """ETag derived from the content of a response, for data not covered by the catalog snapshot."""
+    body = json.dumps(jsonable_encoder(content), sort_keys=True, separators=(",", ":"))
+    return f'"{hashlib.sha1(body.encode()).hexdigest()}"'
+
+def etag_matches(request: Request, etag):
+    """Check the If-None-Match header of `request` against `etag` (weak comparison)."""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match or not etag:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in [tag[2:] if tag.startswith("W/") else tag for tag in tags]
+
+def cache_headers(etag):
+    return {"ETag": etag, "Cache-Control": f"public, max-age={HTTP_CACHE_MAX_AGE}"}
+
+def not_modified(etag):
+    return Response(status_code=304, headers=cache_headers(etag))
+
+def conditional_response(content, request: Request, response: Response, etag=None):
+    """
+    Return `content` with ETag and Cache-Control headers, or an empty 304
+    response if the client already has it. Without a version ETag the
+    ETag is computed from the content.
+    """
+    etag = etag or content_etag(content)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    response.headers.update(cache_headers(etag))
+    return content
+
+def iter_all_data(table, order_by, filters=None, columns="*", data_source=get_data_source()):
+    """Read a whole table from the data source, one page at a time."""
+    offset = 0
+    while True:
+        query = apply_filters(data_source.table(table).select(columns), filters)
+        for column in order_by:
+            query = query.order(column)
+        with backend_query(table):
+            page = query.range(offset, offset + FETCH_PAGE_SIZE - 1).execute().data
+        yield from page
+        if len(page) < FETCH_PAGE_SIZE:
+            return
+        offset += len(page)
+
+def fetch_all_data(table, order_by, filters=None, columns="*", data_source=get_data_source()):
+    """Read a whole table from the data source as a list."""
+    return list(iter_all_data(table, order_by, filters, columns, data_source))
+
+def load_catalog_snapshot():
+    """Build a new catalog snapshot, with its product cards, from Supabase."""
+    return CatalogSnapshot(
+        fetch_all_data("products", ["id"]),
+        fetch_all_data("locations", ["product_id", "store_id"]),
+        fetch_all_data("stores", ["id"]),
+        transform_data
+    )
+
+def load_catalog_tables():
+    """Read the products, locations and stores the in-memory indexes are built from, without product cards."""
+    return CatalogSnapshot(
+        fetch_all_data("products", ["id"]),
+        fetch_all_data("locations", ["product_id", "store_id"]),
+        fetch_all_data("stores", ["id"])
+    )
+
+catalog_cache = SnapshotCache(
+    "catalog", load_catalog_snapshot, CATALOG_CACHE_TTL, CatalogSnapshot.fingerprint
+) if CATALOG_CACHE_ENABLED else None
+
+# Source of the product and store indexes: the catalog snapshot, or without
+# the catalog cache a copy of the same tables only used to build them.
+# Reloads that find the same rows keep the version, so the indexes are
+# only rebuilt when the tables change.
+catalog_source = catalog_cache or SnapshotCache(
+    "catalog_source", load_catalog_tables, CATALOG_CACHE_TTL, CatalogSnapshot.fingerprint
+)
+
+async def get_store_index():
+    """Return the current per-store product index."""
+    return (await get_snapshot(catalog_source)).store_index
+
+def load_recipe_tables():
+    """Read the recipes and their ingredients the recipe indexes are built from."""
+    return TableSnapshot(
+        recipes=fetch_all_data("recipes", ["id"]),
+        recipe_ingredients=fetch_all_data("recipe_ingredients", ["recipe_id", "product_id"])
+    )
+
+recipe_tables = SnapshotCache("recipe_tables", load_recipe_tables, INGREDIENT_INDEX_TTL, TableSnapshot.fingerprint)
+
+def load_ingredient_index(tables):
+    """Build a new recipe ingredient index."""
+    return IngredientIndex(tables.recipes, tables.recipe_ingredients)
+
+ingredient_index = SnapshotCache("ingredient_index", load_ingredient_index, source=recipe_tables)
+
+def load_recipe_name_index(tables):
+    """Build a new trigram index over the recipe names."""
+    return TrigramIndex(tables.recipes, text_field="name")
+
+recipe_name_index = SnapshotCache("recipe_name_index", load_recipe_name_index, source=recipe_tables)
+
+def load_product_search_index(catalog):
+    """Build a new BM25 index over the products."""
+    return BM25Index(list(catalog.products.values()))
+
+product_search_index = SnapshotCache("product_search_index", load_product_search_index, source=catalog_source)
+
+def load_semantic_index(catalog):
+    """
+    Bring the product embedding index up to date with the products.
+
+    Only new or changed products are encoded again. On startup the index
+    persisted in SEMANTIC_INDEX_PATH, if any, is memory-mapped instead of
+    being rebuilt from scratch.
+    """
+    products = list(catalog.products.values())
+
+    previous = semantic_index.current
+    if previous is None and SEMANTIC_INDEX_PATH:
+        previous = SemanticIndex.load(SEMANTIC_INDEX_PATH, create_encoder(SEMANTIC_ENCODER, SEMANTIC_DIM), semantic_manifest())
+
+    if previous is None:
+        index = SemanticIndex.build(create_encoder(SEMANTIC_ENCODER, SEMANTIC_DIM), products)
+    else:
+        index = previous.sync(products)
+
+    if SEMANTIC_INDEX_PATH and index is not previous:
+        index.save(SEMANTIC_INDEX_PATH, semantic_manifest())
+    return index
+
+def semantic_manifest():
+    """Settings a persisted semantic index must have been built with to be reused."""
+    return {"encoder": SEMANTIC_ENCODER, "dim": SEMANTIC_DIM}
+
+semantic_index = SnapshotCache("semantic_index", load_semantic_index, source=catalog_source)
+
+recipe_cache = RecipeDetailCache(RECIPE_CACHE_MAX_BYTES, RECIPE_CACHE_TTL)
+
+async def recipe_data_version():
+    """
+    Versions of the tables recipe details are built from, the catalog and
+    the recipe tables: cached details are rebuilt once a reload finds any
+    of them changed. Read with versioned(), like the derived indexes, so
+    expired snapshots are also reloaded in the background.
+    """
+    await get_snapshot(catalog_source)
+    await get_snapshot(recipe_tables)
+    return catalog_source.versioned()[1], recipe_tables.versioned()[1]
+
+def load_spatial_index(catalog):
+    """Build new per-store grids over the location coordinates."""
+    return SpatialIndex(catalog.locations)
+
+spatial_index = SnapshotCache("spatial_index", load_spatial_index, source=catalog_source)
+
+def load_route_graphs(catalog):
+    """Build new per-store walking distance graphs."""
+    return RouteGraphs(list(catalog.stores.values()), catalog.locations)
+
+route_graphs = SnapshotCache("route_graphs", load_route_graphs, source=catalog_source)
+
+# In-memory snapshots refreshed by /catalog/reload, sources before the indexes derived from them
+snapshot_caches = [
+    catalog_source,
+    recipe_tables,
+    ingredient_index,
+    recipe_name_index,
+    product_search_index,
+    semantic_index,
+    spatial_index,
+    route_graphs
+]
+
+async def attach_locations_and_stores(products, store_ids=None):
+    """
+    Build ProductWithLocation dicts for a list of raw products.
+
+    Locations are fetched with IN queries on product_id (one per
+    IN_QUERY_BATCH_SIZE products, sent concurrently) and the referenced
+    stores with a single IN query on id.
+    Without `store_ids` the first location of each product is used. With
+    `store_ids` only the locations in those stores are read, and each
+    product is shown at its location in the first of them stocking it;
+    products stocked in none of them are skipped.
+    """
+    if not products:
+        return []
+
+    if catalog_cache:
+        return attach_product_cards(products, (await get_snapshot(catalog_cache)).cards, store_ids)
+
+    product_ids = [product["id"] for product in products]
+    if store_ids:
+        locations_by_product, stores_by_id = await get_store_locations_and_stores(product_ids, store_ids)
+    else:
+        locations_by_product, stores_by_id = await get_locations_and_stores(product_ids)
+
+    results = []
+    for product in products:
+        location = locations_by_product.get(product["id"])
+
+        # Skip products that are not stocked in the requested stores
+        if store_ids and not location:
+            continue
+
+        results.append({
+            "product": transform_data(product, "product"),
+            "location": transform_data(location, "location") if location else None,
+            "store": stores_by_id.get(location["store_id"]) if location else None
+        })
+
+    return results
+
+def attach_product_cards(products, cards, store_ids=None):
+    """
+    attach_locations_and_stores with the product cards of the catalog
+    snapshot: one lookup per product (and store) and no query. Products
+    missing from the snapshot (e.g. from a newer search index) are
+    returned without location, unless `store_ids` is given.
+    """
+    results = []
+    for product in products:
+        if store_ids:
+            card = next(filter(None, (cards.get(product["id"], store_id) for store_id in store_ids)), None)
+            # Skip products that are not stocked in the requested stores
+            if card is None:
+                continue
+        else:
+            card = cards.get(product["id"]) or {
+                "product": transform_data(dict(product), "product"),
+                "location": None,
+                "store": None
+            }
+
+        results.append(card)
+
+    return results
+
+async def get_store_locations_and_stores(product_ids, store_ids):
+    """
+    Like get_locations_and_stores, restricted to `store_ids`: the location
+    of each product in the first of `store_ids` stocking it. Only the rows
+    of those stores are read, with get_data_in on locations and one query on stores.
+    """
+    locations, stores = await asyncio.gather(
+        get_data_in("locations", "product_id", product_ids, ["product_id", "store_id"], {"in": {"store_id": store_ids}}),
+        get_data_async("stores", {"in": {"id": store_ids}})
+    )
+
+    rank = {store_id: position for position, store_id in enumerate(store_ids)}
+    locations_by_product = {}
+    for location in sorted(locations, key=lambda location: rank[location["store_id"]]):
+        locations_by_product.setdefault(location["product_id"], location)
+
+    return locations_by_product, {store["id"]: transform_data(store, "store") for store in stores}
+
+async def get_locations_and_stores(product_ids):
+    """
+    Get the first location of each product, keyed by product id, and the
+    stores of those locations, transformed and keyed by store id.
+    Uses get_data_in on locations and one IN query on stores.
+    """
+    locations = await get_data_in("locations", "product_id", product_ids, ["product_id", "store_id"])
+
+    locations_by_product = {}
+    for location in locations:
+        locations_by_product.setdefault(location["product_id"], location)
+
+    store_ids = {location["store_id"] for location in locations_by_product.values()}
+    stores = await get_data_async("stores", {"in": {"id": list(store_ids)}}) if store_ids else []
+    stores_by_id = {store["id"]: transform_data(store, "store") for store in stores}
+
+    return locations_by_product, stores_by_id
+
+async def get_products_by_ids(product_ids):
+    """
+    Build ProductWithLocation dicts for a list of product ids, keyed by id
+    in the order of `product_ids`. Unknown ids are left out.
+
+    The products are read while their locations are, and the stores right
+    after, so three queries are made whatever the number of ids.
+    """
+    product_ids = list(dict.fromkeys(product_ids))
+    if not product_ids:
+        return {}
+
+    if catalog_cache:
+        cards = (await get_snapshot(catalog_cache)).cards
+        return {product_id: cards.get(product_id) for product_id in product_ids if cards.get(product_id)}
+
+    products, (locations_by_product, stores_by_id) = await asyncio.gather(
+        get_data_async("products", {"in": {"id": product_ids}}),
+        get_locations_and_stores(product_ids)
+    )
+    products_by_id = {product["id"]: product for product in products}
+
+    results = {}
+    for product_id in product_ids:
+        product = products_by_id.get(product_id)
+        if not product:
+            continue
+
+        location = locations_by_product.get(product_id)
+        results[product_id] = {
+            "product": transform_data(product, "product"),
+            "location": transform_data(location, "location") if location else None,
+            "store": stores_by_id.get(location["store_id"]) if location else None
+        }
+
+    return results
+
+def matches_attributes(product, query: SearchQuery):
+    """Check the brand and weight criteria of a search against a raw product."""
+    attributes = transform_data(dict(product), "product")["attributes"]
+
+    if query.brand and attributes["brand"].lower() != query.brand.lower():
+        return False
+
+    if query.min_weight is not None and attributes["weight"] < query.min_weight:
+        return False
+
+    if query.max_weight is not None and attributes["weight"] > query.max_weight:
+        return False
+
+    return True
 
 @app.get("/products/", response_model=List[Product])
-def get_products(
+async def get_products(
+    response: Response,
     name: Optional[str] = Query(None, description="Filter by product name"),
     category: Optional[str] = Query(None, description="Filter by category"),
-    tag: Optional[str] = Query(None, description="Filter by tag")
+    tag: Optional[str] = Query(None, description="Filter by tag"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Maximum number of products per page"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor header of the previous page"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. name,attributes")
 ):
     """
     Search for products with optional filters for name, category, and tags.
+    With `limit` the products are returned in pages ordered by id; the cursor
+    of the next page is in the X-Next-Cursor header. `fields` restricts the
+    columns read from the database and returned (id is always included).
     """
+    selected_fields = parse_fields(fields, "products")
     filters = {}
     
     if name:
@@ -226,8 +1032,16 @@ def get_products(
     
     if tag:
         filters["contains"] = {"tags": [tag]}
+
+    if cursor:
+        filters["after"] = {"id": decode_cursor(cursor)[0]}
     
-    products = get_data("products", filters)
+    products = await get_data_async(
+        "products", filters,
+        order_by=["id"] if limit or cursor else None,
+        limit=limit,
+        columns=select_columns(selected_fields)
+    )
     
     # Search log
     search_term = name or category or tag or "all"
@@ -237,69 +1051,323 @@ def get_products(
         "results_count": len(products)
     })
     
-    return [transform_data(p, "product") for p in products]
+    headers = {"X-Next-Cursor": next_cursor(products, limit)}
+    products = [project(transform_data(p, "product"), selected_fields) for p in products]
+    return list_response(products, response, headers, selected_fields, Product)
 
 @app.get("/products/{product_id}", response_model=ProductWithLocation)
-def get_product(product_id: str, include_location: bool = True, include_store: bool = True):
+async def get_product(product_id: str, request: Request, response: Response,
+                      include_location: bool = True, include_store: bool = True):
     """
     Get detailed information about a specific product.
     Optionally include location and store information.
+    The product and its locations are fetched concurrently.
+    Supports conditional requests with ETag / If-None-Match: with the catalog
+    cache enabled an unchanged product is answered with 304 from its card,
+    without building the response.
     """
-    products = get_data("products", {"eq": {"id": product_id}})
+    if catalog_cache:
+        card = (await get_snapshot(catalog_cache)).cards.get(product_id)
+        if not card:
+            raise HTTPException(status_code=404, detail="Product not found")
+        # Checked once the product is known to exist, so unknown ids never get a 304
+        etag = await catalog_etag()
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        result = {"product": card["product"]}
+        if include_location and card["location"]:
+            result["location"] = card["location"]
+            if include_store and card["store"]:
+                result["store"] = card["store"]
+        return conditional_response(result, request, response, etag)
+
+    products, locations = await asyncio.gather(
+        get_data_async("products", {"eq": {"id": product_id}}),
+        get_data_async("locations", {"eq": {"product_id": product_id}}) if include_location else no_data()
+    )
     
     if not products:
-        return {"error": "Product not found"}
+        raise HTTPException(status_code=404, detail="Product not found")
     
     product = transform_data(products[0], "product")
     result = {"product": product}
     
     if include_location:
-        locations = get_data("locations", {"eq": {"product_id": product_id}})
-        
         if locations:
             location = transform_data(locations[0], "location")
             result["location"] = location
             
             if include_store and location:
-                stores = get_data("stores", {"eq": {"id": location["store_id"]}})
+                stores = await get_data_async("stores", {"eq": {"id": location["store_id"]}})
                 
                 if stores:
                     store = transform_data(stores[0], "store")
                     result["store"] = store
     
-    return result
+    return conditional_response(result, request, response)
+
+@app.post("/products/batch", response_model=Dict[str, ProductWithLocation])
+async def get_products_batch(request: ProductBatchRequest, response: Response):
+    """
+    Get several products with their location and store information, keyed by product id.
+    Unknown ids are left out of the result. The lookup takes three backend
+    queries whatever the number of ids, reported in the X-Backend-Round-Trips header.
+    """
+    reset_round_trips()
+
+    results = await get_products_by_ids(request.ids)
+
+    response.headers["X-Backend-Round-Trips"] = str(round_trips())
+    return results
+
+@app.post("/products/resolve", response_model=List[ResolvedProduct])
+def resolve_products(request: ProductResolveRequest):
+    """
+    Resolve free-text names (e.g. ingredients) to the best matching product each.
+    Names are matched with the BM25 index used by ranked search, all in
+    one request, and a single search log is written for the whole list.
+    Results are in the order of the names.
+    """
+    index = product_search_index.get()
+
+    results = []
+    for name in request.names:
+        matches = index.search(name, 1)
+        if matches:
+            product, score = matches[0]
+            results.append({"name": name, "product_id": product["id"], "product_name": product["name"], "score": score})
+        else:
+            results.append({"name": name})
+
+    resolved = sum(1 for result in results if "product_id" in result)
+    # query_term is a varchar(255)
+    log_search("product_resolve", ", ".join(request.names)[:255], resolved == len(results), {
+        "names_count": len(request.names),
+        "resolved_count": resolved
+    })
+
+    return results
 
 @app.get("/stores/{store_id}/products", response_model=List[ProductWithLocation])
-def get_store_products(store_id: str, data_source = get_data_source()):
+async def get_store_products(
+    store_id: str,
+    response: Response,
+    stream: bool = Query(False, description="Stream the products as NDJSON, one JSON object per line")
+):
     """
     Get all products available in a specific store with their locations.
+    With stream=true the products are sent as NDJSON while the store is
+    being read, so neither the server nor the client buffers the whole inventory.
     """
-    # Get locations for the store
-    locations_response = data_source.table("locations").select("*").eq("store_id", store_id).execute()
-    store_locations = locations_response.data
-    
+    if stream:
+        async def ndjson_lines():
+            async for batch in iter_store_products(store_id):
+                yield b"".join(dumps(row) + b"\n" for row in shape_rows(batch, ProductWithLocation))
+
+        return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
+
     results = []
-    for location in store_locations:
-        product_response = data_source.table("products").select("*").eq("id", location["product_id"]).execute()
-        product = product_response.data[0] if product_response.data else None
-        
-        if product:
-            results.append({
-                "product": product,
-                "location": location
-            })
+    async for batch in iter_store_products(store_id):
+        results.extend(batch)
+
+    return list_response(results, response, model=ProductWithLocation)
+
+@app.get("/stores/{store_id}/products/nearest", response_model=List[NearbyProduct])
+async def get_nearest_products(
+    store_id: str,
+    x: float = Query(..., description="X coordinate of the point"),
+    y: float = Query(..., description="Y coordinate of the point"),
+    k: int = Query(10, ge=1, le=100, description="Maximum number of products to return"),
+    max_distance: Optional[float] = Query(None, gt=0, description="Only return products within this distance")
+):
+    """
+    Get the products of a store nearest to a point, closest first.
+    Served from a per-store grid over the location coordinates, so only
+    the locations around the point are looked at.
+    """
+    grid = (await get_snapshot(spatial_index)).get(store_id)
+    matches = grid.nearest(x, y, k, max_distance) if grid else []
 
+    distances = {location["product_id"]: distance for location, distance in matches}
+    results = await get_store_products_at(store_id, [location for location, _ in matches])
+    for result in results:
+        result["distance"] = distances[result["product"]["id"]]
     return results
 
+@app.get("/stores/{store_id}/products/within", response_model=List[ProductWithLocation])
+async def get_products_within(
+    store_id: str,
+    x_min: float = Query(..., description="Left side of the rectangle"),
+    y_min: float = Query(..., description="Bottom side of the rectangle"),
+    x_max: float = Query(..., description="Right side of the rectangle"),
+    y_max: float = Query(..., description="Top side of the rectangle"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Maximum number of products to return")
+):
+    """
+    Get the products of a store whose location is inside a rectangle, e.g. an aisle.
+    Served from the same per-store grid as /stores/{store_id}/products/nearest.
+    """
+    if x_min > x_max or y_min > y_max:
+        raise HTTPException(status_code=400, detail="x_min and y_min must not be greater than x_max and y_max")
+
+    grid = (await get_snapshot(spatial_index)).get(store_id)
+    locations = grid.within(x_min, y_min, x_max, y_max) if grid else []
+    return await get_store_products_at(store_id, locations[:limit])
+
+@app.post("/stores/{store_id}/route", response_model=PickRoute)
+async def get_pick_route(store_id: str, request: RouteRequest):
+    """
+    Order a list of products into a short walking route through a store.
+    """
+    return await build_pick_route(store_id, request.product_ids, request.start_x, request.start_y)
+
+async def build_pick_route(store_id, product_ids, start_x=None, start_y=None, ingredients=None):
+    """
+    Build a PickRoute through the locations of `product_ids` in a store.
+
+    Walking distances come from the precomputed aisle graph of the store,
+    the order from a nearest neighbour tour improved with 2-opt.
+    `ingredients` optionally gives the quantity and unit of each product.
+    """
+    graph = (await get_snapshot(route_graphs)).get(store_id)
+    product_ids = list(dict.fromkeys(product_ids))
+    locations = [graph.locations[product_id] for product_id in product_ids if product_id in graph.locations] if graph else []
+    missing = [product_id for product_id in product_ids if not graph or product_id not in graph.locations]
+    if not locations:
+        return {"store_id": store_id, "total_distance": 0.0, "stops": [], "missing": missing}
+
+    start = graph.entrance() if start_x is None or start_y is None else (None, start_x, start_y)
+    points = [start] + [
+        (str(location.get("aisle")), float(location.get("x_coordinate") or 0), float(location.get("y_coordinate") or 0))
+        for location in locations
+    ]
+    order, legs = plan_route(graph.point_distances(points))
+    ordered = [locations[point - 1] for point in order]
+    legs_by_product = {location["product_id"]: leg for location, leg in zip(ordered, legs)}
+
+    stops = await get_store_products_at(store_id, ordered)
+    for stop in stops:
+        stop["distance"] = legs_by_product[stop["product"]["id"]]
+        if ingredients:
+            stop.update(ingredients.get(stop["product"]["id"], {}))
+
+    return {"store_id": store_id, "total_distance": sum(legs), "stops": stops, "missing": missing}
+
+async def get_store_products_at(store_id, locations):
+    """
+    Build ProductWithLocation dicts for raw locations of a store, in the
+    same order. Products and the store are read with one query each, or
+    taken from the product cards when the catalog cache is enabled.
+    """
+    if not locations:
+        return []
+
+    if catalog_cache:
+        cards = (await get_snapshot(catalog_cache)).cards
+        return list(filter(None, (cards.get(location["product_id"], store_id) for location in locations)))
+
+    products, stores = await asyncio.gather(
+        get_data_async("products", {"in": {"id": [location["product_id"] for location in locations]}}),
+        get_data_async("stores", {"eq": {"id": store_id}})
+    )
+    products_by_id = {product["id"]: product for product in products}
+    store = transform_data(stores[0], "store") if stores else None
+
+    return [
+        {
+            "product": transform_data(products_by_id[location["product_id"]], "product"),
+            "location": transform_data(dict(location), "location"),
+            "store": store
+        }
+        for location in locations if location["product_id"] in products_by_id
+    ]
+
+async def iter_store_products(store_id):
+    """
+    Yield the products of a store with their locations, one batch at a time.
+
+    Locations are read in pages of STORE_PRODUCTS_BATCH_SIZE, ordered by
+    product_id with a keyset condition, and the products of each page with
+    a single IN query. The next page of locations is read while the products
+    of the current one are. With the catalog cache the batches are made of
+    the product cards of the store, without any query.
+    """
+    if catalog_cache:
+        snapshot = await get_snapshot(catalog_cache)
+        product_ids = sorted(location["product_id"] for location in snapshot.locations_by_store.get(store_id, []))
+        for start in range(0, len(product_ids), STORE_PRODUCTS_BATCH_SIZE):
+            cards = [snapshot.cards.get(product_id, store_id) for product_id in product_ids[start:start + STORE_PRODUCTS_BATCH_SIZE]]
+            yield [{"product": card["product"], "location": card["location"]} for card in cards if card]
+        return
+
+    async def read_locations(after=None):
+        filters = {"eq": {"store_id": store_id}}
+        if after is not None:
+            filters["after"] = {"product_id": after}
+        return await fetch_data_async("locations", filters, order_by=["product_id"], limit=STORE_PRODUCTS_BATCH_SIZE)
+
+    locations = await read_locations()
+    while locations:
+        last_product_id = locations[-1]["product_id"] if len(locations) == STORE_PRODUCTS_BATCH_SIZE else None
+        products, next_locations = await asyncio.gather(
+            get_data_async("products", {"in": {"id": [location["product_id"] for location in locations]}}),
+            read_locations(last_product_id) if last_product_id is not None else no_data()
+        )
+        products_by_id = {product["id"]: product for product in products}
+
+        yield [
+            {
+                "product": transform_data(products_by_id[location["product_id"]], "product"),
+                "location": transform_data(location, "location")
+            }
+            for location in locations if location["product_id"] in products_by_id
+        ]
+
+        locations = next_locations
+
+async def get_products_among(stocked, filters, limit=None, columns="*"):
+    """
+    Get the products matching `filters` whose id is in `stocked`, in id order.
+
+    The filters are applied by the data source and `stocked` in memory, so
+    no query carries the ids of a whole store inventory. With a limit, pages
+    are read after the last product seen until the page is full; the page
+    size is scaled by the share of the catalog in `stocked`, so one query is
+    usually enough.
+    """
+    if not stocked:
+        return []
+
+    if limit is None:
+        products = await get_data_async("products", filters, order_by=["id"], columns=columns)
+        return [product for product in products if product["id"] in stocked]
+
+    catalog_size = len((await get_snapshot(catalog_source)).products)
+    page_size = min(max(limit, limit * catalog_size // len(stocked)), FETCH_PAGE_SIZE)
+    products = []
+    while len(products) < limit:
+        page = await get_data_async("products", filters, order_by=["id"], limit=page_size, columns=columns)
+        products.extend(product for product in page if product["id"] in stocked)
+        if len(page) < page_size:
+            break
+        filters = {**filters, "after": {"id": page[-1]["id"]}}
+    return products[:limit]
+
 @app.post("/search/", response_model=List[ProductWithLocation])
-def search_products(query: SearchQuery):
+async def search_products(query: SearchQuery, response: Response):
     """
     Advanced search endpoint that allows searching with multiple criteria.
     Returns products with their locations and store information when available.
+    The number of backend round trips is reported in the X-Backend-Round-Trips header.
     """
+    reset_round_trips()
+    selected_fields = parse_fields(query.fields, "products")
+    if query.cursor and query.mode in ("ranked", "semantic") and query.name:
+        raise HTTPException(status_code=400, detail="cursor is only supported outside ranked and semantic mode")
+
     filters = {}
     
-    if query.name:
+    if query.name and query.mode not in ("ranked", "semantic"):
         filters["ilike"] = filters.get("ilike", {})
         filters["ilike"]["name"] = query.name
         
@@ -311,29 +1379,58 @@ def search_products(query: SearchQuery):
         filters["contains"] = filters.get("contains", {})
         filters["contains"]["tags"] = query.tags
         
-    # Get filtered products
-    products = get_data("products", filters)
-    
-    # Further filter by attributes that might require special logic
-    if query.brand or query.min_weight is not None or query.max_weight is not None:
-        filtered_products = []
-        for product in products:
-            p = transform_data(product, "product")
+    # Store-scoped search: only the products stocked in the requested stores are considered
+    store_ids = list(dict.fromkeys(query.store_ids or ([query.store_id] if query.store_id else [])))
+    stocked = (await get_store_index()).product_ids(store_ids) if store_ids else None
+    in_stores = lambda product: stocked is None or product["id"] in stocked
 
-            if not p:
-                continue    
-            
-            if query.brand and p["attributes"]["brand"].lower() != query.brand.lower():
-                continue
-                
-            if query.min_weight is not None and p["attributes"]["weight"] < query.min_weight:
-                continue
-                
-            if query.max_weight is not None and p["attributes"]["weight"] > query.max_weight:
-                continue
-                
-            filtered_products.append(product)
-        products = filtered_products
+    scores = {}
+    headers = {}
+    if query.mode == "ranked" and query.name:
+        # Relevance-ranked full-text search, other criteria are checked on each candidate
+        matches = (await get_snapshot(product_search_index)).search(
+            query.name,
+            query.limit or PRODUCT_SEARCH_LIMIT,
+            accept=lambda product: in_stores(product) and matches_filters(product, filters) and matches_attributes(product, query)
+        )
+        products = [product for product, _ in matches]
+        scores = {product["id"]: score for product, score in matches}
+    elif query.mode == "semantic" and query.name:
+        # Nearest products by embedding similarity, then the other criteria
+        limit = query.limit or PRODUCT_SEARCH_LIMIT
+        restricted = filters or stocked is not None or query.brand or query.min_weight is not None or query.max_weight is not None
+        matches = (await get_snapshot(semantic_index)).search(
+            query.name,
+            limit * SEMANTIC_CANDIDATE_FACTOR if restricted else limit,
+            SEMANTIC_NPROBE
+        )
+        scores = {product_id: score for product_id, score in matches if stocked is None or product_id in stocked}
+        candidates = await get_data_async("products", {"in": {"id": list(scores)}}) if scores else []
+        candidates.sort(key=lambda product: -scores[product["id"]])
+        products = [
+            product for product in candidates
+            if matches_filters(product, filters) and matches_attributes(product, query)
+        ][:limit]
+    else:
+        # Get filtered products, a page at a time when a limit or cursor is given
+        if query.cursor:
+            filters["after"] = {"id": decode_cursor(query.cursor)[0]}
+        by_attributes = query.brand or query.min_weight is not None or query.max_weight is not None
+        columns = select_columns(selected_fields, ["attributes"] if by_attributes else [])
+        if stocked is not None:
+            products = await get_products_among(stocked, filters, query.limit, columns)
+        else:
+            products = await get_data_async(
+                "products", filters,
+                order_by=["id"] if query.limit or query.cursor else None,
+                limit=query.limit,
+                columns=columns
+            )
+        headers["X-Next-Cursor"] = next_cursor(products, query.limit)
+        
+        # Further filter by attributes that might require special logic
+        if by_attributes:
+            products = [product for product in products if matches_attributes(product, query)]
     
     # Advanced search log
     search_term = query.name or query.category or (query.tags[0] if query.tags else None) or query.brand or "advanced_search"
@@ -345,69 +1442,29 @@ def search_products(query: SearchQuery):
     })
     
     # Build results with location and store
-    results = []
-    for product in products:
-        transformed_product = transform_data(product, "product")
-        
-        # Find location for this product
-        locations = get_data("locations", {"eq": {"product_id": product["id"]}})
-        location = locations[0] if locations else None
-        
-        # Skip if store_id is specified and doesn't match
-        if query.store_id and (not location or location["store_id"] != query.store_id):
-            continue
-            
-        transformed_location = transform_data(location, "location") if location else None
-        
-        # Find store for this location
-        store = None
-        if location:
-            stores = get_data("stores", {"eq": {"id": location["store_id"]}})
-            store = stores[0] if stores else None
-        
-        transformed_store = transform_data(store, "store") if store else None
-        
-        # Add to results
-        results.append({
-            "product": transformed_product,
-            "location": transformed_location,
-            "store": transformed_store
-        })
-    
-    return results
+    results = await attach_locations_and_stores(products, store_ids)
+    for result in results:
+        result["score"] = scores.get(result["product"]["id"])
+        result["product"] = project(result["product"], selected_fields)
+
+    headers["X-Backend-Round-Trips"] = str(round_trips())
+    return list_response(results, response, headers, selected_fields, ProductWithLocation)
 
 @app.post("/search_recipes/", response_model=List[RecipeWithDetails])
-def search_recipes(query: SearchQuery):
+async def search_recipes(query: SearchQuery, response: Response):
     """
     Advanced search endpoint for recipes.
     Allows searching by recipe name and ingredient.
     Returns recipes with detailed ingredient information including product locations.
-    Uses efficient database search for large datasets.
+    Names are matched with an in-memory trigram index, so misspelled or
+    badly transcribed names still match; results are ranked by similarity.
     """
     filters = {}
     
     if query.name:
-        # For Supabase, use multiple ilike conditions to implement fuzzy search
-        search_term = query.name.lower().strip()
-        search_words = search_term.split()
-        
-        # Get recipes with any word match using Supabase's built-in search
-        recipes = []
-        # First try exact match with ilike
-        exact_filters = {"ilike": {"name": search_term}}
-        exact_matches = get_data("recipes", exact_filters)
-        recipes.extend(exact_matches)
-        
-        # Then try word-by-word matches
-        for word in search_words:
-            if len(word) > 2:  # Skip very short words
-                word_filters = {"ilike": {"name": word}}
-                word_matches = get_data("recipes", word_filters)
-                # Add only new matches
-                for match in word_matches:
-                    if not any(r["id"] == match["id"] for r in recipes):
-                        recipes.append(match)
-                            
+        matches = (await get_snapshot(recipe_name_index)).search(query.name, RECIPE_SEARCH_LIMIT, RECIPE_SEARCH_MIN_SCORE)
+        recipes = [recipe for recipe, _ in matches]
+        scores = {recipe["id"]: score for recipe, score in matches}
     else:
         return []
     
@@ -420,62 +1477,52 @@ def search_recipes(query: SearchQuery):
         "results_count": len(recipes)
     })
     
-    # Build results with ingredient details
-    results = []
+    # Build results with ingredient details from the recipe cache; the
+    # details of the other recipes are looked up for all of them at once
+    version = await recipe_data_version()
+    entries = {}
     for recipe in recipes:
-        transformed_recipe = transform_data(recipe, "recipe")
+        entry = recipe_cache.get(recipe["id"], version)
+        if entry is not None:
+            entries[recipe["id"]] = entry
 
-        recipe_ingredients = get_data("recipe_ingredients", {"eq": {"recipe_id": recipe["id"]}})
+    missing = [recipe for recipe in recipes if recipe["id"] not in entries]
+    if missing:
+        recipe_ingredients = await get_data_async("recipe_ingredients", {"in": {"recipe_id": [recipe["id"] for recipe in missing]}})
+        ingredients_details = await get_ingredients_details(recipe_ingredients)
+        entries.update(cache_recipe_details(missing, recipe_ingredients, ingredients_details, version))
 
-        # Get product details for each ingredient
-        ingredients_details = []
-        if len(recipe_ingredients) > 0:
-            for ingredients in recipe_ingredients:
-                product_id = ingredients["product_id"]
-                
-                # Get product info
-                products = get_data("products", {"eq": {"id": product_id}})
-                if products:
-                    product = transform_data(products[0], "product")
-                    
-                    # Get location info
-                    locations = get_data("locations", {"eq": {"product_id": product_id}})
-                    location = transform_data(locations[0], "location") if locations else None
-                    
-                    # Get store info if location exists
-                    store = None
-                    if location:
-                        stores = get_data("stores", {"eq": {"id": location["store_id"]}})
-                        store = transform_data(stores[0], "store") if stores else None
-                    
-                    # Add complete product info to ingredients
-                    ingredients_details.append({
-                        "product": product,
-                        "location": location,
-                        "store": store,
-                        "quantity": ingredients.get("quantity", 0),
-                        "unit": ingredients.get("unit", "")
-                    })
-        
-        results.append({
-            "recipe": transformed_recipe,
-            "ingredients_details": ingredients_details
-        })
-    
-    return results
+    return list_response([
+        {**entries[recipe["id"]].details, "score": scores[recipe["id"]]}
+        for recipe in recipes
+    ], response, model=RecipeWithDetails)
 
 @app.get("/recipes/", response_model=List[Recipe])
-def get_recipes(
-    name: Optional[str] = Query(None, description="Filter by recipe name")
+async def get_recipes(
+    response: Response,
+    name: Optional[str] = Query(None, description="Filter by recipe name"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Maximum number of recipes per page"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor header of the previous page"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. name")
 ):
     """
-    Get all recipes with optional name filter
+    Get all recipes with optional name filter.
+    Supports the same pagination (limit, cursor) and projection (fields) as /products/.
     """
+    selected_fields = parse_fields(fields, "recipes")
     filters = {}
     if name:
         filters["ilike"] = {"name": name}
+
+    if cursor:
+        filters["after"] = {"id": decode_cursor(cursor)[0]}
     
-    recipes = get_data("recipes", filters)
+    recipes = await get_data_async(
+        "recipes", filters,
+        order_by=["id"] if limit or cursor else None,
+        limit=limit,
+        columns=select_columns(selected_fields)
+    )
     
     # Log della ricerca
     search_term = name or "all"
@@ -485,71 +1532,109 @@ def get_recipes(
         "results_count": len(recipes)
     })
     
-    return [transform_data(r, "recipe") for r in recipes]
+    headers = {"X-Next-Cursor": next_cursor(recipes, limit)}
+    recipes = [project(transform_data(r, "recipe"), selected_fields) for r in recipes]
+    return list_response(recipes, response, headers, selected_fields, Recipe)
 
 @app.get("/recipes/{recipe_id}", response_model=RecipeWithDetails)
-def get_recipe(recipe_id: str):
+async def get_recipe(recipe_id: str, request: Request, response: Response):
     """
-    Get detailed information about a specific recipe including ingredient details with locations
+    Get detailed information about a specific recipe including ingredient details with locations.
+    Supports conditional requests with ETag / If-None-Match: the ETag is the
+    one of the cached details, so the recipe is always looked up first and
+    unknown ids get a 404, never a 304.
     """
-    recipes = get_data("recipes", {"eq": {"id": recipe_id}})
+    version = await recipe_data_version()
+    entry = recipe_cache.get(recipe_id, version)
 
-    if not recipes:
-        return {"error": "Recipe not found"}
-        
-    recipe = recipes[0]
-    transformed_recipe = transform_data(recipe, "recipe")
+    if entry is None:
+        # The recipe and its ingredients only depend on recipe_id, so they are fetched concurrently
+        recipes, recipe_ingredients = await asyncio.gather(
+            get_data_async("recipes", {"eq": {"id": recipe_id}}),
+            get_data_async("recipe_ingredients", {"eq": {"recipe_id": recipe_id}})
+        )
 
-    recipe_ingredients = get_data("recipe_ingredients", {"eq": {"recipe_id": recipe["id"]}})
+        if not recipes:
+            raise HTTPException(status_code=404, detail="Recipe not found")
 
-    # Get product details for each ingredient
-    ingredients_details = []
-    if len(recipe_ingredients) > 0:
-        for ingredients in recipe_ingredients:
-            product_id = ingredients["product_id"]
-            
-            # Get product info
-            products = get_data("products", {"eq": {"id": product_id}})
-            if products:
-                product = transform_data(products[0], "product")
-                
-                # Get location info
-                locations = get_data("locations", {"eq": {"product_id": product_id}})
-                location = transform_data(locations[0], "location") if locations else None
-                
-                # Get store info if location exists
-                store = None
-                if location:
-                    stores = get_data("stores", {"eq": {"id": location["store_id"]}})
-                    store = transform_data(stores[0], "store") if stores else None
-                
-                # Add complete product info to ingredients
-                ingredients_details.append({
-                    "product": product,
-                    "location": location,
-                    "store": store,
-                    "quantity": ingredients.get("quantity", 0),
-                    "unit": ingredients.get("unit", "")
-                })
-    return {
-        "recipe": transformed_recipe,
-        "ingredients_details": ingredients_details
+        ingredients_details = await get_ingredients_details(recipe_ingredients)
+        entry = cache_recipe_details(recipes, recipe_ingredients, ingredients_details, version)[recipe_id]
+
+    return conditional_response(entry.details, request, response, entry.etag)
+
+@app.get("/recipes/{recipe_id}/route", response_model=PickRoute)
+async def get_recipe_route(
+    recipe_id: str,
+    store_id: str = Query(..., description="Store to shop the ingredients in"),
+    start_x: Optional[float] = Query(None, description="X coordinate of the start, the entrance by default"),
+    start_y: Optional[float] = Query(None, description="Y coordinate of the start, the entrance by default")
+):
+    """
+    Get the ingredients of a recipe ordered into a short walking route through a store,
+    with their quantity and unit.
+    """
+    recipe_ingredients = await get_data_async("recipe_ingredients", {"eq": {"recipe_id": recipe_id}})
+    ingredients = {
+        ingredient["product_id"]: {"quantity": ingredient.get("quantity", 0), "unit": ingredient.get("unit", "")}
+        for ingredient in recipe_ingredients
     }
+    return await build_pick_route(store_id, list(ingredients), start_x, start_y, ingredients)
+
+def cache_recipe_details(recipes, recipe_ingredients, ingredients_details, version):
+    """
+    Assemble the RecipeWithDetails dicts of `recipes` and store them in the
+    recipe cache, along with their ETag and ingredient products.
+
+    Returns:
+        The cache entries, keyed by recipe id
+    """
+    product_ids = {}
+    for ingredient in recipe_ingredients:
+        product_ids.setdefault(ingredient["recipe_id"], []).append(ingredient["product_id"])
+
+    entries = {}
+    for recipe in recipes:
+        details = {
+            "recipe": transform_data(recipe, "recipe"),
+            "ingredients_details": ingredients_details.get(recipe["id"], [])
+        }
+        entries[recipe["id"]] = recipe_cache.put(
+            recipe["id"], version, details, product_ids.get(recipe["id"], []), content_etag(details)
+        )
+    return entries
+
+async def get_ingredients_details(recipe_ingredients):
+    """
+    Get product, location and store details for a list of recipe_ingredients rows.
+    All the products are looked up with a single batch, see get_products_by_ids.
+
+    Returns:
+        The ingredient details of each recipe, keyed by recipe id
+    """
+    products = await get_products_by_ids([ingredient["product_id"] for ingredient in recipe_ingredients])
+
+    ingredients_details = {}
+    for ingredient in recipe_ingredients:
+        product = products.get(ingredient["product_id"])
+
+        # Ingredients whose product no longer exists are skipped
+        if product:
+            ingredients_details.setdefault(ingredient["recipe_id"], []).append({
+                **product,
+                "quantity": ingredient.get("quantity", 0),
+                "unit": ingredient.get("unit", "")
+            })
+
+    return ingredients_details
     
 @app.get("/recipes/by-ingredient/{product_id}", response_model=List[Recipe])
 def get_recipes_by_ingredient(product_id: str):
     """
     Get all recipes that use a specific product as ingredient
     """
-    recipes = get_data("recipes")
-    
-    matching_recipes = []
-    for recipe in recipes:
-        ingredients =  get_data("recipe_ingredients", {"eq": {"recipe_id": recipe["id"]}})
-        if any(ing["product_id"] == product_id for ing in ingredients):
-            matching_recipes.append(transform_data(recipe, "recipe"))
-            
-    return matching_recipes
+    recipes = ingredient_index.get().recipes_using(product_id)
+
+    return [transform_data(recipe, "recipe") for recipe in recipes]
 
 @app.post("/recipes/best-by-ingredients", response_model=Recipe)
 def get_best_recipe_by_ingredients(ingredient_ids: List[str] = Query(..., description="List of ingredient IDs")):
@@ -562,26 +1647,104 @@ def get_best_recipe_by_ingredients(ingredient_ids: List[str] = Query(..., descri
     Returns:
         The recipe that contains the highest number of specified ingredients.
     """
-    recipes = get_data("recipes")
-    best_recipe = None
-    max_matching = 0
-
-    for recipe in recipes:
-        ingredients = get_data("recipe_ingredients", {"eq": {"recipe_id": recipe["id"]}})
-        matching_count = sum(1 for ing in ingredients if ing["product_id"] in ingredient_ids)
-        
-        if matching_count > max_matching:
-            max_matching = matching_count
-            best_recipe = recipe
+    best_recipe = ingredient_index.get().best_recipe(ingredient_ids)
 
     if not best_recipe:
         return {"error": "No matching recipe found"}
 
     return best_recipe
 
+@app.post("/recipes/ranked-by-ingredients", response_model=List[RankedRecipe])
+def get_ranked_recipes_by_ingredients(
+    ingredient_ids: List[str] = Query(..., description="List of ingredient IDs"),
+    k: int = Query(5, ge=1, le=100, description="Maximum number of recipes to return")
+):
+    """
+    Get the top-k recipes for a set of ingredients.
+    
+    Args:
+        ingredient_ids: List of product IDs representing the ingredients.
+        k: Maximum number of recipes to return.
+        
+    Returns:
+        Recipes ranked by coverage of the recipe and share of the given
+        ingredients they use, with ties broken by matched count.
+    """
+    return ingredient_index.get().rank(ingredient_ids, k)
+
+def warm_up_snapshots():
+    """Load every in-memory snapshot that has not been loaded yet."""
+    for cache in snapshot_caches:
+        try:
+            cache.get()
+        except Exception as e:
+            logger.error(f"Failed to load {cache.name} snapshot: {str(e)}")
+
+@app.post("/catalog/reload")
+def reload_catalog():
+    """
+    Reload the in-memory catalog snapshot and search indexes from Supabase.
+    """
+    result = {"catalog_cache_enabled": CATALOG_CACHE_ENABLED}
+
+    for cache in snapshot_caches:
+        snapshot = cache.reload()
+        result[cache.name] = {
+            "version": cache.version,
+            "counts": snapshot.counts()
+        }
+    result["recipe_cache"] = {"invalidated": recipe_cache.clear()}
+
+    return result
+
+@app.get("/recipes/cache/stats")
+def get_recipe_cache_stats():
+    """
+    Get the size and hit/miss counters of the recipe detail cache.
+    """
+    return recipe_cache.stats()
+
+@app.post("/recipes/cache/invalidate")
+def invalidate_recipe_cache(request: RecipeCacheInvalidation):
+    """
+    Drop the cached details of some recipes, e.g. after they were edited,
+    and of the recipes using some products, e.g. after they were edited or moved.
+    Without ids the whole cache is dropped.
+    """
+    if not request.recipe_ids and not request.product_ids:
+        return {"invalidated": recipe_cache.clear()}
+    return {"invalidated": recipe_cache.invalidate(request.recipe_ids, request.product_ids)}
+
+def insert_search_logs(log_entries: List[Dict[str, Any]]):
+    """Insert a batch of search logs in the data source."""
+    with backend_query("search_logs", "insert"):
+        get_data_source().table("search_logs").insert(log_entries).execute()
+
+def load_search_log_history(cutoff: datetime):
+    """Read the columns needed by the rollups for the logs written before `cutoff`."""
+    return iter_all_data(
+        "search_logs",
+        ["timestamp", "id"],
+        filters={"lt": {"timestamp": cutoff.isoformat()}},
+        columns="search_type,query_term,found,timestamp"
+    )
+
+# Aggregates behind /logs/stats, kept up to date as searches are logged
+search_log_rollups = SearchLogRollups(load_search_log_history)
+
+search_log_writer = SearchLogWriter(
+    insert_search_logs,
+    batch_size=SEARCH_LOG_BATCH_SIZE,
+    flush_interval=SEARCH_LOG_FLUSH_INTERVAL,
+    max_queue_size=SEARCH_LOG_QUEUE_SIZE,
+    # Only the logs actually written are counted in /logs/stats
+    on_written=search_log_rollups.add_many
+)
+
 def log_search(search_type: str, query_term: str, found: bool, details: Optional[Dict[str, Any]] = None):
     """
     Log a search in the logging database.
+    The entry is written in the background, so the search never waits for it.
     
     Args:
         search_type: Type of search ("product" or "recipe")
@@ -598,19 +1761,31 @@ def log_search(search_type: str, query_term: str, found: bool, details: Optional
         "details": details or {}
     }
 
-    # Insert the log in Supabase
-    supabase.table("search_logs").insert(log_entry).execute()
+    # Queue the log for the batched insert in Supabase
+    search_log_writer.submit(log_entry)
     
     return log_entry
 
+@app.get("/logs/queue")
+def get_logs_queue():
+    """
+    Get the state of the search log write-behind queue.
+    """
+    return search_log_writer.stats()
+
 @app.get("/logs/", response_model=List[SearchLog])
-def get_logs(
+async def get_logs(
+    response: Response,
     search_type: Optional[str] = Query(None, description="Filter by search type (product/recipe)"),
     found: Optional[bool] = Query(None, description="Filter by found status"),
-    limit: int = Query(100, description="Maximum number of logs to return")
+    limit: int = Query(100, ge=1, le=1000, description="Maximum number of logs to return"),
+    since: Optional[datetime] = Query(None, description="Only return logs newer than this timestamp"),
+    cursor: Optional[str] = Query(None, description="Cursor returned in X-Next-Cursor by the previous page")
 ):
     """
-    Retrieve search logs with optional filters.
+    Retrieve search logs with optional filters, most recent first.
+    Ordering and limit are applied by the database; when more logs are
+    available the cursor of the next page is returned in the X-Next-Cursor header.
     """
     filters = {}
     
@@ -621,117 +1796,74 @@ def get_logs(
     if found is not None:
         filters["eq"] = filters.get("eq", {})
         filters["eq"]["found"] = found
+
+    if since:
+        filters["gt"] = {"timestamp": since.isoformat()}
+
+    if cursor:
+        timestamp, log_id = decode_cursor(cursor, size=2)
+        filters["before"] = {"timestamp": timestamp, "id": log_id}
     
-    logs = get_data("search_logs", filters)
-    
-    # Ordina per timestamp (più recenti prima)
-    logs.sort(key=lambda x: x.get("timestamp", ""), reverse=True)
-    
-    # Limita il numero di risultati
-    logs = logs[:limit]
+    # Ordina per timestamp (più recenti prima) e limita il numero di risultati
+    logs = await fetch_data_async("search_logs", filters, order_by=["timestamp", "id"], descending=True, limit=limit)
+
+    if len(logs) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor([logs[-1]["timestamp"], logs[-1]["id"]])
     
     return logs
 
 
 @app.get("/logs/stats")
-def get_logs_stats():
+def get_logs_stats(
+    days: Optional[int] = Query(None, ge=1, description="Only include the last N days")
+):
     """
     Get aggregated statistics from search logs.
+    Served from incrementally maintained rollups, so the logs are not rescanned.
+    The rollups are kept by each worker process and count the history read
+    at the first call plus the logs this worker wrote successfully since:
+    with several workers the statistics are approximate.
     """
-    logs = get_data("search_logs")
-    
-    if not logs:
-        return {
-            "total_searches": 0,
-            "successful_searches": 0,
-            "failed_searches": 0,
-            "search_types": {},
-            "top_products": [],
-            "top_not_found": [],
-            "daily_stats": {}
-        }
-    
-    # Statistiche generali
-    total_searches = len(logs)
-    successful_searches = len([log for log in logs if log["found"]])
-    failed_searches = total_searches - successful_searches
-    
-    # Conteggio per tipo di ricerca
-    search_types = {}
-    for log in logs:
-        search_type = log["search_type"]
-        if search_type not in search_types:
-            search_types[search_type] = 0
-        search_types[search_type] += 1
-    
-    # Top prodotti ricercati
-    product_searches = [log for log in logs if log["search_type"] in ["product", "product_advanced"]]
-    product_terms = {}
-    for log in product_searches:
-        term = log["query_term"]
-        if term in ["all", "advanced_search"]:
-            continue
-        if term not in product_terms:
-            product_terms[term] = {"total": 0, "found": 0}
-        product_terms[term]["total"] += 1
-        if log["found"]:
-            product_terms[term]["found"] += 1
-    
-    top_products = [
-        {
-            "term": term,
-            "count": stats["total"],
-            "found_percent": (stats["found"] / stats["total"]) * 100
-        }
-        for term, stats in product_terms.items()
-    ]
-    top_products.sort(key=lambda x: x["count"], reverse=True)
-    top_products = top_products[:10]  # Top 10
-    
-    # Top prodotti non trovati
-    not_found_searches = [log for log in product_searches if not log["found"]]
-    not_found_terms = {}
-    for log in not_found_searches:
-        term = log["query_term"]
-        if term in ["all", "advanced_search"]:
-            continue
-        if term not in not_found_terms:
-            not_found_terms[term] = 0
-        not_found_terms[term] += 1
-    
-    top_not_found = [
-        {"term": term, "count": count}
-        for term, count in not_found_terms.items()
-    ]
-    top_not_found.sort(key=lambda x: x["count"], reverse=True)
-    top_not_found = top_not_found[:10]  # Top 10
-    
-    # Statistiche giornaliere
-    daily_stats = {}
-    for log in logs:
-        # Estrai la data dalla timestamp
-        if isinstance(log["timestamp"], str):
-            date = log["timestamp"].split("T")[0]
-        else:
-            date = log["timestamp"].strftime("%Y-%m-%d")
-            
-        if date not in daily_stats:
-            daily_stats[date] = {"total": 0, "success": 0, "failed": 0}
-        daily_stats[date]["total"] += 1
-        if log["found"]:
-            daily_stats[date]["success"] += 1
-        else:
-            daily_stats[date]["failed"] += 1
-    
-    return {
-        "total_searches": total_searches,
-        "successful_searches": successful_searches,
-        "failed_searches": failed_searches,
-        "search_types": search_types,
-        "top_products": top_products,
-        "top_not_found": top_not_found,
-        "daily_stats": daily_stats
-    }
+    return search_log_rollups.stats(days)
+
+def collect_cache_counters(counter):
+    """(cache name, value) of a hit/miss counter of the snapshot caches and of the recipe detail cache."""
+    for cache in snapshot_caches:
+        yield (cache.name,), getattr(cache, counter)
+    yield ("recipe_details",), getattr(recipe_cache, counter)
+
+def collect_cache_hit_ratios():
+    for (name,), hits in collect_cache_counters("hits"):
+        misses = recipe_cache.misses if name == "recipe_details" else next(
+            cache.misses for cache in snapshot_caches if cache.name == name
+        )
+        yield (name,), hits / (hits + misses) if hits + misses else 0.0
+
+# Values kept by the caches and the log writer, read when /metrics is scraped
+metrics.callback("product_api_cache_hits_total", "Cache lookups served from memory", "counter",
+                 ["cache"], lambda: collect_cache_counters("hits"))
+metrics.callback("product_api_cache_misses_total", "Cache lookups that had to load the data", "counter",
+                 ["cache"], lambda: collect_cache_counters("misses"))
+metrics.callback("product_api_cache_hit_ratio", "Share of the cache lookups served from memory", "gauge",
+                 ["cache"], collect_cache_hit_ratios)
+metrics.callback("product_api_snapshot_version", "Number of times each snapshot has been loaded", "gauge",
+                 ["cache"], lambda: (((cache.name,), cache.version) for cache in snapshot_caches))
+metrics.callback("product_api_snapshot_age_seconds", "Seconds since each snapshot was loaded", "gauge",
+                 ["cache"], lambda: (((cache.name,), cache.age) for cache in snapshot_caches))
+metrics.callback("product_api_recipe_cache_bytes", "Estimated size of the cached recipe details", "gauge",
+                 [], lambda: [((), recipe_cache.stats()["bytes"])])
+metrics.callback("product_api_search_log_queue_depth", "Search logs waiting to be written", "gauge",
+                 [], lambda: [((), search_log_writer.depth())])
+metrics.callback("product_api_search_logs_total", "Search logs by outcome of their write", "counter",
+                 ["outcome"], lambda: (((outcome,), search_log_writer.stats()[outcome]) for outcome in ("written", "failed", "dropped")))
+
+@app.get("/metrics")
+def get_metrics():
+    """
+    Get the request latencies, backend query counts and durations, cache
+    hit ratios and log queue depth in the Prometheus text format.
+    """
+    return Response(metrics.render(), media_type=CONTENT_TYPE)
 
 
 if __name__ == "__main__":
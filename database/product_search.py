@@ -0,0 +1,171 @@
+import re
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from fuzzy_index import normalize
+
+# Fields indexed for ranked product search and their weight in the score
+FIELD_WEIGHTS = {
+    "name": 3.0,
+    "tags": 2.0,
+    "brand": 1.5,
+    "category": 1.0,
+    "description": 1.0
+}
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+# Minimum growth of the candidates ordered by search() when `accept` rejects too many of them
+ACCEPT_GROWTH = 4
+
+ITALIAN_STOPWORDS = {
+    "a", "ad", "agli", "ai", "al", "all", "alla", "alle", "allo", "c", "che", "chi", "coi", "col", "con",
+    "d", "da", "dagli", "dai", "dal", "dall", "dalla", "dalle", "dallo", "degli", "dei", "del", "dell",
+    "della", "delle", "dello", "di", "e", "ed", "fra", "gli", "i", "il", "in", "l", "la", "le", "lo",
+    "ma", "negli", "nei", "nel", "nell", "nella", "nelle", "nello", "non", "o", "per", "piu", "senza",
+    "su", "sugli", "sui", "sul", "sull", "sulla", "sulle", "sullo", "tra", "un", "una", "uno"
+}
+
+
+def stem(word: str) -> str:
+    """
+    Light Italian stemmer: conflate singular/plural and masculine/feminine forms.
+
+    "pomodoro"/"pomodori" -> "pomodor", "funghi"/"fungo" -> "fung", "pasta"/"paste" -> "past".
+    """
+    if len(word) <= 3 or word.isdigit():
+        return word
+    if word.endswith(("chi", "che", "ghi", "ghe")):
+        return word[:-2]
+    if word[-1] in "aeio":
+        return word[:-1]
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    """Normalize, split on non-word characters (apostrophes included), drop stopwords and stem."""
+    return [stem(word) for word in re.findall(r"\w+", normalize(text)) if word not in ITALIAN_STOPWORDS]
+
+
+def field_text(record: Dict[str, Any], field: str) -> str:
+    """Read a field from a product row, flattened or with nested attributes."""
+    value = record.get(field)
+    if value is None:
+        value = (record.get("attributes") or {}).get(field)
+    if isinstance(value, list):
+        return " ".join(str(item) for item in value)
+    return str(value or "")
+
+
+class BM25Index:
+    """
+    In-memory inverted index over product rows, scored with BM25.
+
+    Term frequencies are summed over the indexed fields with FIELD_WEIGHTS,
+    so a match in the name counts more than one in the description. The
+    BM25 contribution of every (term, product) pair is computed when the
+    index is built, so a query only adds up a few precomputed arrays.
+    """
+
+    def __init__(self, records: List[Dict[str, Any]], field_weights: Dict[str, float] = FIELD_WEIGHTS):
+        self.records = records
+        frequencies: Dict[str, Dict[int, float]] = {}
+        lengths = np.zeros(len(records), dtype=np.float32)
+
+        for position, record in enumerate(records):
+            for field, weight in field_weights.items():
+                for term in tokenize(field_text(record, field)):
+                    postings = frequencies.setdefault(term, {})
+                    postings[position] = postings.get(position, 0.0) + weight
+                    lengths[position] += weight
+
+        average_length = float(lengths.mean()) if len(records) else 0.0
+        norms = K1 * (1 - B + B * lengths / average_length) if average_length else lengths
+
+        # term -> (positions, BM25 impacts)
+        self.postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        for term, postings in frequencies.items():
+            positions = np.fromiter(postings.keys(), dtype=np.int32, count=len(postings))
+            tf = np.fromiter(postings.values(), dtype=np.float32, count=len(postings))
+            idf = np.log(1 + (len(records) - len(postings) + 0.5) / (len(postings) + 0.5))
+            self.postings[term] = (positions, (idf * tf * (K1 + 1) / (tf + norms[positions])).astype(np.float32))
+
+    def counts(self) -> Dict[str, int]:
+        return {"products": len(self.records), "terms": len(self.postings)}
+
+    def search(self, text: str, limit: int = 20,
+               accept: Optional[Callable[[Dict[str, Any]], bool]] = None) -> List[Tuple[Dict[str, Any], float]]:
+        """
+        Return up to `limit` (product copy, score) pairs for `text`, best first.
+
+        Args:
+            text: Free-text query
+            limit: Maximum number of results
+            accept: Optional filter; rejected products are skipped without shortening the result
+        """
+        if limit <= 0:
+            return []
+
+        # Candidates are ordered a chunk at a time: the best `limit` first and,
+        # while `accept` rejects too many of them, the best of the others with
+        # a growing size. Each round only partitions what is not ordered yet.
+        candidates, scores = self.matches(text)
+        results = []
+        size = limit
+        checked = 0
+        while len(candidates):
+            best = self._best(scores, size)
+            top, top_scores = (candidates, scores) if best is None else (candidates[best], scores[best])
+            order = np.lexsort((top, -top_scores))
+            for position, score in zip(top[order].tolist(), top_scores[order].tolist()):
+                record = self.records[position]
+                if accept is not None and not accept(record):
+                    continue
+                results.append((dict(record), score))
+                if len(results) == limit:
+                    return results
+            if best is None:
+                break
+            candidates, scores = candidates[~best], scores[~best]
+            # Enough candidates for the missing results at the acceptance rate seen so far
+            checked += len(top)
+            size = max(size * ACCEPT_GROWTH, (limit - len(results)) * checked // max(len(results), 1))
+        return results
+
+    @staticmethod
+    def _best(scores: np.ndarray, size: int) -> Optional[np.ndarray]:
+        """
+        Mask of the `size` best scores, or None when there are no more than
+        `size` of them. The scores must be those of candidates in load order:
+        of the scores tied with the threshold only the first ones are kept,
+        so ordering the masked candidates round after round gives the full
+        order (best score first, ties in load order) without ever sorting
+        the large groups of ties of broad queries.
+        """
+        if len(scores) <= size:
+            return None
+        threshold = np.partition(scores, len(scores) - size)[len(scores) - size]
+        best = scores > threshold
+        best[np.flatnonzero(scores == threshold)[:size - np.count_nonzero(best)]] = True
+        return best
+
+    def matches(self, text: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Positions of the indexed products matching `text`, in load order, and
+        their BM25 scores; empty if no term of `text` is known.
+        """
+        terms = [term for term in dict.fromkeys(tokenize(text)) if term in self.postings]
+        if not terms:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+        if len(terms) == 1:
+            # The postings of a term already are its matches and their scores
+            return self.postings[terms[0]]
+
+        scores = np.zeros(len(self.records), dtype=np.float32)
+        for term in terms:
+            positions, impacts = self.postings[term]
+            scores[positions] += impacts
+        positions = np.flatnonzero(scores)
+        return positions, scores[positions]
@@ -0,0 +1,140 @@
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, Optional, Set
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class CachedRecipe:
+    """Assembled recipe details with what is needed to validate and serve them."""
+
+    __slots__ = ("details", "etag", "version", "product_ids", "size", "created_at")
+
+    def __init__(self, details: Dict[str, Any], etag: Optional[str], version: Hashable,
+                 product_ids: Set[str], size: int):
+        self.details = details
+        self.etag = etag
+        self.version = version
+        self.product_ids = product_ids
+        self.size = size
+        self.created_at = time.monotonic()
+
+
+class RecipeDetailCache:
+    """
+    LRU cache of fully assembled recipe details, keyed by recipe id.
+
+    The memory used by the entries is estimated from the size of their JSON
+    encoding and capped at `max_bytes`; the least recently used entries are
+    evicted first. An entry is stale, and counted as a miss, once the data
+    `version` it was built from has changed or it is older than `ttl`.
+    Entries can also be invalidated by recipe id or by the id of one of
+    their ingredient products.
+    """
+
+    def __init__(self, max_bytes: int = 16 * 1024 * 1024, ttl: float = 0):
+        """
+        Args:
+            max_bytes: Maximum estimated size of the cached details (0 = cache disabled)
+            ttl: Seconds after which an entry is rebuilt (0 = never)
+        """
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries: "OrderedDict[str, CachedRecipe]" = OrderedDict()
+        self._recipes_by_product: Dict[str, Set[str]] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, recipe_id: str, version: Hashable) -> Optional[CachedRecipe]:
+        """Return the fresh entry of `recipe_id` for the data `version`, or None."""
+        with self._lock:
+            entry = self._entries.get(recipe_id)
+            if entry is not None and (entry.version != version or self._expired(entry)):
+                self._remove(recipe_id)
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(recipe_id)
+            self.hits += 1
+            return entry
+
+    def put(self, recipe_id: str, version: Hashable, details: Dict[str, Any],
+            product_ids: Iterable[str], etag: Optional[str] = None) -> CachedRecipe:
+        """Cache the details of a recipe and return the entry; entries larger than the cache are not kept."""
+        entry = CachedRecipe(details, etag, version, set(product_ids), len(json.dumps(details, default=str)))
+        if entry.size > self.max_bytes:
+            return entry
+
+        with self._lock:
+            self._remove(recipe_id)
+            self._entries[recipe_id] = entry
+            self._bytes += entry.size
+            for product_id in entry.product_ids:
+                self._recipes_by_product.setdefault(product_id, set()).add(recipe_id)
+
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+        return entry
+
+    def invalidate(self, recipe_ids: Iterable[str] = (), product_ids: Iterable[str] = ()) -> int:
+        """Drop the entries of `recipe_ids` and of the recipes using `product_ids`. Returns how many were dropped."""
+        with self._lock:
+            stale = set(recipe_ids)
+            for product_id in product_ids:
+                stale |= self._recipes_by_product.get(product_id, set())
+
+            removed = sum(1 for recipe_id in stale if self._remove(recipe_id))
+            self.invalidations += removed
+            return removed
+
+    def clear(self) -> int:
+        """Drop every entry. Returns how many were dropped."""
+        with self._lock:
+            removed = len(self._entries)
+            self._entries.clear()
+            self._recipes_by_product.clear()
+            self._bytes = 0
+            self.invalidations += removed
+            return removed
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations
+        }
+
+    def _expired(self, entry: CachedRecipe) -> bool:
+        return bool(self.ttl) and time.monotonic() - entry.created_at > self.ttl
+
+    def _remove(self, recipe_id: str) -> bool:
+        entry = self._entries.pop(recipe_id, None)
+        if entry is None:
+            return False
+
+        self._bytes -= entry.size
+        for product_id in entry.product_ids:
+            recipes = self._recipes_by_product.get(product_id)
+            if recipes is not None:
+                recipes.discard(recipe_id)
+                if not recipes:
+                    del self._recipes_by_product[product_id]
+        return True
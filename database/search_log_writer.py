@@ -0,0 +1,152 @@
+import logging
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class SearchLogWriter:
+    """
+    Write-behind buffer for search log entries.
+
+    Requests only put entries on a bounded in-memory queue; a background
+    thread inserts them in batches once `batch_size` entries are waiting
+    or `flush_interval` seconds have passed since the first one. When the
+    queue is full new entries are dropped and counted instead of slowing
+    down or failing the search that produced them.
+    """
+
+    def __init__(self, insert_batch: Callable[[List[Dict[str, Any]]], Any], batch_size: int = 100,
+                 flush_interval: float = 2.0, max_queue_size: int = 10000,
+                 on_written: Optional[Callable[[List[Dict[str, Any]]], Any]] = None):
+        """
+        Args:
+            insert_batch: Function inserting a list of log entries in the database
+            batch_size: Number of entries that triggers a flush
+            flush_interval: Maximum seconds an entry waits before being flushed
+            max_queue_size: Maximum number of entries kept in memory
+            on_written: Function called with every batch once it has been inserted
+        """
+        self.insert_batch = insert_batch
+        self.on_written = on_written
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.failed = 0
+        self.dropped = 0
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=max_queue_size)
+        self._write_lock = threading.Lock()
+        # Entries submitted and not written (or failed) yet, including the
+        # batch the background thread is collecting or writing
+        self._unwritten = 0
+        self._unwritten_changed = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="search-log-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, entry: Dict[str, Any]) -> bool:
+        """Queue an entry for writing. Returns False if it was dropped."""
+        with self._unwritten_changed:
+            self._unwritten += 1
+        try:
+            self._queue.put_nowait(entry)
+            return True
+        except queue.Full:
+            self._done(1)
+            self.dropped += 1
+            return False
+
+    def depth(self) -> int:
+        """Number of entries waiting to be written."""
+        return self._queue.qsize()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "queued": self.depth(),
+            "written": self.written,
+            "failed": self.failed,
+            "dropped": self.dropped
+        }
+
+    def flush(self):
+        """
+        Write every queued entry now, in batches, then wait for the batch
+        the background thread may have already taken: when flush returns,
+        every entry submitted before has been written or has failed.
+        """
+        while True:
+            batch = self._take(self.batch_size)
+            if batch:
+                self._write(batch)
+                continue
+            with self._unwritten_changed:
+                if self._unwritten <= 0:
+                    return
+                # Woken up by the background write, or after a while to take the entries submitted meanwhile
+                self._unwritten_changed.wait(self.flush_interval)
+
+    def close(self, timeout: float = 10.0):
+        """Stop the background thread and flush what is left."""
+        self._stop.set()
+        self._thread.join(timeout)
+        self.flush()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+
+            # Wait for more entries until the batch is full or the first one is too old
+            batch = [first]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size and not self._stop.is_set():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            self._write(batch)
+
+    def _take(self, limit: int) -> List[Dict[str, Any]]:
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch: List[Dict[str, Any]]):
+        try:
+            self._insert(batch)
+        finally:
+            self._done(len(batch))
+
+    def _insert(self, batch: List[Dict[str, Any]]):
+        with self._write_lock:
+            try:
+                self.insert_batch(batch)
+                self.written += len(batch)
+            except Exception as e:
+                self.failed += len(batch)
+                logger.error(f"SearchLogWriter: failed to write {len(batch)} search logs: {str(e)}")
+                return
+
+            if self.on_written is not None:
+                try:
+                    self.on_written(batch)
+                except Exception as e:
+                    logger.error(f"SearchLogWriter: on_written failed for {len(batch)} search logs: {str(e)}")
+
+    def _done(self, count: int):
+        with self._unwritten_changed:
+            self._unwritten -= count
+            self._unwritten_changed.notify_all()
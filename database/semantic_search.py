@@ -0,0 +1,346 @@
+import abc
+import importlib
+import json
+import logging
+import os
+import zlib
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from fuzzy_index import normalize
+from product_search import ITALIAN_STOPWORDS, field_text
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Product fields embedded for semantic search
+PRODUCT_TEXT_FIELDS = ("name", "category", "tags", "brand", "description")
+
+# Below this many products a brute-force scan is faster than probing partitions
+IVF_MIN_SIZE = 20000
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE_SIZE = 20000
+# Texts hashed together by the n-gram encoder
+ENCODE_CHUNK_SIZE = 2048
+# Written last by SemanticIndex.save: an index directory without it is incomplete
+MANIFEST_FILE = "manifest.json"
+
+_FNV_PRIME = np.uint32(16777619)
+
+
+def product_text(record: Dict[str, Any]) -> str:
+    """Text embedded for a product row."""
+    return " ".join(field_text(record, field) for field in PRODUCT_TEXT_FIELDS)
+
+
+def fingerprint(text: str) -> int:
+    """Cheap checksum used to detect products whose text changed."""
+    return zlib.crc32(text.encode())
+
+
+class Encoder(abc.ABC):
+    """
+    Interface of the text encoders used by SemanticIndex.
+
+    Encoders return one L2-normalized float32 row per text. Learned state
+    (vocabulary statistics, weights...) is exposed as named arrays so it
+    can be persisted next to the index.
+    """
+
+    dim: int
+
+    def fit(self, texts: Sequence[str]):
+        pass
+
+    @abc.abstractmethod
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        ...
+
+    def state(self) -> Dict[str, np.ndarray]:
+        return {}
+
+    def load_state(self, state: Dict[str, np.ndarray]):
+        pass
+
+
+class HashedNgramEncoder(Encoder):
+    """
+    Offline TF-IDF encoder over hashed character n-grams.
+
+    Words are normalized (lowercase, no accents, no stopwords) and their
+    character n-grams are hashed into `dim` buckets, so related forms
+    ("pomodoro", "pomodori", "pomodorini") end up close to each other
+    without any model download.
+    """
+
+    def __init__(self, dim: int = 256, min_n: int = 3, max_n: int = 5):
+        self.dim = dim
+        self.min_n = min_n
+        self.max_n = max_n
+        self.idf = np.ones(dim, dtype=np.float32)
+
+    def fit(self, texts: Sequence[str]):
+        """Learn the inverse document frequency of every bucket."""
+        document_frequency = np.zeros(self.dim, dtype=np.float64)
+        for start in range(0, len(texts), ENCODE_CHUNK_SIZE):
+            document_frequency += (self._counts(texts[start:start + ENCODE_CHUNK_SIZE]) > 0).sum(axis=0)
+        self.idf = (np.log((1 + len(texts)) / (1 + document_frequency)) + 1).astype(np.float32)
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for start in range(0, len(texts), ENCODE_CHUNK_SIZE):
+            vectors[start:start + ENCODE_CHUNK_SIZE] = np.log1p(self._counts(texts[start:start + ENCODE_CHUNK_SIZE])) * self.idf
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def state(self) -> Dict[str, np.ndarray]:
+        return {"idf": self.idf}
+
+    def load_state(self, state: Dict[str, np.ndarray]):
+        self.idf = np.asarray(state["idf"], dtype=np.float32)
+
+    def _counts(self, texts: Sequence[str]) -> np.ndarray:
+        """
+        Bucket counts of the character n-grams of every word, one row per text.
+
+        The texts are concatenated and hashed together with vectorized FNV
+        hashing; n-grams spanning two texts are discarded.
+        """
+        padded = [
+            f" {' '.join(word for word in normalize(text).split() if word not in ITALIAN_STOPWORDS)} ".encode()
+            for text in texts
+        ]
+        data = np.frombuffer(b"".join(padded), dtype=np.uint8).astype(np.uint32)
+        owners = np.repeat(np.arange(len(padded)), [len(text) for text in padded])
+
+        counts = np.zeros(len(padded) * self.dim, dtype=np.int64)
+        for n in range(self.min_n, self.max_n + 1):
+            if len(data) < n:
+                break
+            size = len(data) - n + 1
+            hashes = np.full(size, 2166136261 + n, dtype=np.uint32)
+            for offset in range(n):
+                hashes = (hashes ^ data[offset:size + offset]) * _FNV_PRIME
+            inside = owners[:size] == owners[n - 1:]
+            counts += np.bincount(owners[:size][inside] * self.dim + (hashes[inside] % self.dim).astype(np.int64),
+                                  minlength=len(counts))
+        return counts.reshape(len(padded), self.dim)
+
+
+def create_encoder(spec: str = "hashed", dim: int = 256) -> Encoder:
+    """
+    Build the encoder named by `spec`.
+
+    "hashed" is the built-in HashedNgramEncoder; any other value is read as
+    "module:factory" and the factory is called with no arguments, so a local
+    sentence-embedding model can be plugged in without changing this module.
+    """
+    if spec == "hashed":
+        return HashedNgramEncoder(dim=dim)
+
+    module_name, _, factory_name = spec.partition(":")
+    return getattr(importlib.import_module(module_name), factory_name)()
+
+
+class SemanticIndex:
+    """
+    Cosine-similarity index over product embeddings stored in a NumPy matrix.
+
+    Small catalogs are searched brute force. From IVF_MIN_SIZE products the
+    rows are partitioned with spherical k-means and a query only scans the
+    `nprobe` partitions whose centroids are closest to it.
+    """
+
+    def __init__(self, encoder: Encoder, ids: List[str], fingerprints: np.ndarray, embeddings: np.ndarray,
+                 centroids: Optional[np.ndarray] = None, assignments: Optional[np.ndarray] = None):
+        self.encoder = encoder
+        self.ids = ids
+        self.positions = {product_id: position for position, product_id in enumerate(ids)}
+        self.fingerprints = fingerprints
+        self.embeddings = embeddings
+        self.centroids = centroids
+        self.assignments = assignments
+        self._build_partitions()
+
+    @classmethod
+    def build(cls, encoder: Encoder, records: List[Dict[str, Any]]) -> "SemanticIndex":
+        """Fit the encoder and embed every product row."""
+        texts = [product_text(record) for record in records]
+        encoder.fit(texts)
+        embeddings = encoder.encode(texts)
+        centroids, assignments = None, None
+        if len(records) >= IVF_MIN_SIZE:
+            centroids = train_centroids(embeddings, int(np.sqrt(len(records))))
+            assignments = assign(embeddings, centroids)
+        return cls(encoder, [record["id"] for record in records],
+                   np.array([fingerprint(text) for text in texts], dtype=np.uint32),
+                   embeddings, centroids, assignments)
+
+    def counts(self) -> Dict[str, int]:
+        return {
+            "products": len(self.ids),
+            "dim": int(self.embeddings.shape[1]) if len(self.ids) else 0,
+            "partitions": 0 if self.centroids is None else len(self.centroids)
+        }
+
+    def sync(self, records: List[Dict[str, Any]]) -> "SemanticIndex":
+        """
+        Return a new index matching `records`, re-encoding only new or changed products.
+
+        The encoder and the partition centroids are kept as they are. If
+        nothing changed the index itself is returned.
+        """
+        texts = [product_text(record) for record in records]
+        fingerprints = np.array([fingerprint(text) for text in texts], dtype=np.uint32)
+        old_positions = np.array([self.positions.get(record["id"], -1) for record in records], dtype=np.int64)
+
+        reused = old_positions >= 0
+        reused[reused] = self.fingerprints[old_positions[reused]] == fingerprints[reused]
+        changed = np.flatnonzero(~reused)
+        ids = [record["id"] for record in records]
+        if not len(changed) and ids == self.ids:
+            return self
+
+        embeddings = np.empty((len(records), self.embeddings.shape[1]), dtype=np.float32)
+        embeddings[reused] = self.embeddings[old_positions[reused]]
+        if len(changed):
+            embeddings[changed] = self.encoder.encode([texts[i] for i in changed])
+
+        assignments = None
+        if self.centroids is not None:
+            assignments = np.empty(len(records), dtype=np.int32)
+            assignments[reused] = self.assignments[old_positions[reused]]
+            if len(changed):
+                assignments[changed] = assign(embeddings[changed], self.centroids)
+
+        logger.info(f"SemanticIndex.sync: re-encoded {len(changed)} of {len(records)} products")
+        return SemanticIndex(self.encoder, ids, fingerprints, embeddings, self.centroids, assignments)
+
+    def search(self, text: str, k: int = 20, nprobe: int = 32) -> List[Tuple[str, float]]:
+        """Return up to `k` (product id, cosine similarity) pairs for `text`, best first."""
+        if not self.ids or k <= 0:
+            return []
+        query = self.encoder.encode([text])[0]
+
+        if self.centroids is None:
+            candidates = None
+            scores = self.embeddings @ query
+        else:
+            probed = np.argsort(-(self.centroids @ query))[:nprobe]
+            candidates = np.concatenate([
+                self._partition_rows[self._partition_offsets[p]:self._partition_offsets[p + 1]] for p in probed
+            ])
+            scores = self.embeddings[candidates] @ query
+
+        top = np.argpartition(-scores, k - 1)[:k] if len(scores) > k else np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        rows = top if candidates is None else candidates[top]
+        return [(self.ids[row], float(scores[i])) for row, i in zip(rows, top) if scores[i] > 0]
+
+    def save(self, directory: str, manifest: Dict[str, Any]):
+        """
+        Persist the index as .npy files that `load` can memory-map.
+
+        `manifest` describes the encoder (e.g. its spec and dimension); it
+        is removed first and written last, so a directory left half
+        written by a crash is never loaded.
+        """
+        os.makedirs(directory, exist_ok=True)
+        manifest_path = os.path.join(directory, MANIFEST_FILE)
+        if os.path.exists(manifest_path):
+            os.remove(manifest_path)
+
+        arrays = {"embeddings": self.embeddings, "fingerprints": self.fingerprints}
+        if self.centroids is not None:
+            arrays["centroids"] = self.centroids
+            arrays["assignments"] = self.assignments
+        for name, array in self.encoder.state().items():
+            arrays[f"encoder_{name}"] = array
+
+        for name, array in arrays.items():
+            _write_atomically(os.path.join(directory, f"{name}.npy"), lambda f, a=array: np.save(f, a))
+        _write_atomically(os.path.join(directory, "ids.json"), lambda f: f.write(json.dumps(self.ids).encode()))
+        # Arrays of a previous save this index does not have (e.g. centroids)
+        for file_name in os.listdir(directory):
+            if file_name.endswith(".npy") and file_name[:-len(".npy")] not in arrays:
+                os.remove(os.path.join(directory, file_name))
+        manifest = dict(manifest, products=len(self.ids), dim=int(self.embeddings.shape[1]))
+        _write_atomically(manifest_path, lambda f: f.write(json.dumps(manifest).encode()))
+
+    @classmethod
+    def load(cls, directory: str, encoder: Encoder, manifest: Dict[str, Any]) -> Optional["SemanticIndex"]:
+        """
+        Load an index saved with `save`; the embeddings are memory-mapped, not read.
+
+        Returns None if the directory holds no complete index or one saved
+        with a different manifest (another encoder or dimension), which
+        has to be rebuilt.
+        """
+        try:
+            with open(os.path.join(directory, MANIFEST_FILE)) as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            logger.info(f"SemanticIndex.load: no complete index in {directory}")
+            return None
+
+        expected = dict(manifest, dim=encoder.dim)
+        if any(saved.get(key) != value for key, value in expected.items()):
+            logger.warning(f"SemanticIndex.load: index in {directory} was saved with {saved}, expected {expected}")
+            return None
+
+        def read(name, mmap_mode=None):
+            path = os.path.join(directory, f"{name}.npy")
+            return np.load(path, mmap_mode=mmap_mode) if os.path.exists(path) else None
+
+        encoder.load_state({
+            file_name[len("encoder_"):-len(".npy")]: np.load(os.path.join(directory, file_name))
+            for file_name in os.listdir(directory) if file_name.startswith("encoder_")
+        })
+        with open(os.path.join(directory, "ids.json")) as f:
+            ids = json.load(f)
+        embeddings = read("embeddings", mmap_mode="r")
+        if len(ids) != saved.get("products") or embeddings is None or embeddings.shape != (len(ids), encoder.dim):
+            logger.warning(f"SemanticIndex.load: index files in {directory} do not match their manifest")
+            return None
+        return cls(encoder, ids, read("fingerprints"), embeddings,
+                   read("centroids"), read("assignments"))
+
+    def _build_partitions(self):
+        """Group the row numbers by partition, so a probe reads one contiguous slice."""
+        if self.centroids is None:
+            return
+        self._partition_rows = np.argsort(self.assignments, kind="stable").astype(np.int64)
+        self._partition_offsets = np.searchsorted(self.assignments[self._partition_rows],
+                                                  np.arange(len(self.centroids) + 1))
+
+
+def train_centroids(embeddings: np.ndarray, n_partitions: int, seed: int = 0) -> np.ndarray:
+    """Spherical k-means on a sample of the (normalized) embeddings."""
+    rng = np.random.default_rng(seed)
+    sample = embeddings[rng.choice(len(embeddings), min(KMEANS_SAMPLE_SIZE, len(embeddings)), replace=False)]
+    centroids = sample[rng.choice(len(sample), n_partitions, replace=False)].copy()
+
+    for _ in range(KMEANS_ITERATIONS):
+        labels = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, sample)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        # Empty partitions keep their previous centroid
+        centroids = np.where(norms > 0, sums / np.maximum(norms, 1e-12), centroids)
+    return centroids.astype(np.float32)
+
+
+def assign(embeddings: np.ndarray, centroids: np.ndarray, chunk_size: int = 8192) -> np.ndarray:
+    """Index of the closest centroid of every row, computed in chunks to bound memory."""
+    return np.concatenate([
+        np.argmax(embeddings[start:start + chunk_size] @ centroids.T, axis=1)
+        for start in range(0, len(embeddings), chunk_size)
+    ] or [np.zeros(0, dtype=np.int64)]).astype(np.int32)
+
+
+def _write_atomically(path: str, write):
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "wb") as f:
+        write(f)
+    os.replace(temporary_path, path)
@@ -0,0 +1,137 @@
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Average number of locations per cell when the cell size is chosen automatically
+CELL_OCCUPANCY = 8
+
+
+class StoreGrid:
+    """
+    Uniform grid over the (x, y) coordinates of the locations of one store.
+
+    Locations are sorted by cell, so each cell is a contiguous slice of the
+    coordinate arrays and a query only reads the cells it overlaps.
+    """
+
+    def __init__(self, locations: List[Dict[str, Any]], cell_size: Optional[float] = None):
+        self.locations = locations
+        self.xs = np.array([float(location.get("x_coordinate") or 0) for location in locations], dtype=np.float64)
+        self.ys = np.array([float(location.get("y_coordinate") or 0) for location in locations], dtype=np.float64)
+        self.cell_size = cell_size or self.default_cell_size()
+
+        cells_x = np.floor(self.xs / self.cell_size).astype(np.int64)
+        cells_y = np.floor(self.ys / self.cell_size).astype(np.int64)
+        order = np.lexsort((cells_y, cells_x))
+        self.xs, self.ys = self.xs[order], self.ys[order]
+        self.locations = [locations[position] for position in order]
+        cells_x, cells_y = cells_x[order], cells_y[order]
+
+        # (cell x, cell y) -> (start, end) slice of the sorted arrays
+        self.cells: Dict[Tuple[int, int], Tuple[int, int]] = {}
+        if len(order):
+            boundaries = np.flatnonzero((np.diff(cells_x) != 0) | (np.diff(cells_y) != 0)) + 1
+            starts = np.concatenate(([0], boundaries))
+            ends = np.concatenate((boundaries, [len(order)]))
+            for start, end in zip(starts.tolist(), ends.tolist()):
+                self.cells[(int(cells_x[start]), int(cells_y[start]))] = (start, end)
+            self.bounds = (int(cells_x.min()), int(cells_y.min()), int(cells_x.max()), int(cells_y.max()))
+        else:
+            self.bounds = (0, 0, -1, -1)
+
+    def __len__(self) -> int:
+        return len(self.locations)
+
+    def default_cell_size(self) -> float:
+        """Cell size giving about CELL_OCCUPANCY locations per cell over the bounding box."""
+        if len(self.xs) < 2:
+            return 1.0
+        area = max(float(np.ptp(self.xs)), 1.0) * max(float(np.ptp(self.ys)), 1.0)
+        return max(math.sqrt(area * CELL_OCCUPANCY / len(self.xs)), 1e-6)
+
+    def within(self, x_min: float, y_min: float, x_max: float, y_max: float) -> List[Dict[str, Any]]:
+        """Locations inside the rectangle (bounds included), in grid order."""
+        positions = self._positions(
+            range(max(self._cell(x_min), self.bounds[0]), min(self._cell(x_max), self.bounds[2]) + 1),
+            range(max(self._cell(y_min), self.bounds[1]), min(self._cell(y_max), self.bounds[3]) + 1)
+        )
+        xs, ys = self.xs[positions], self.ys[positions]
+        inside = positions[(xs >= x_min) & (xs <= x_max) & (ys >= y_min) & (ys <= y_max)]
+        return [self.locations[position] for position in inside]
+
+    def nearest(self, x: float, y: float, k: int = 10,
+                max_distance: Optional[float] = None) -> List[Tuple[Dict[str, Any], float]]:
+        """
+        Return up to `k` (location, distance) pairs nearest to (x, y), closest first.
+
+        Rings of cells around the point are read until the k-th distance
+        found is shorter than any location outside the rings can be.
+        """
+        if not self.locations or k <= 0:
+            return []
+
+        center_x, center_y = self._cell(x), self._cell(y)
+        # Rings needed to cover the whole grid from the point
+        max_ring = max(abs(center_x - self.bounds[0]), abs(center_x - self.bounds[2]),
+                       abs(center_y - self.bounds[1]), abs(center_y - self.bounds[3]))
+        if max_distance is not None:
+            max_ring = min(max_ring, int(max_distance // self.cell_size) + 1)
+
+        # Rings closer than this one do not reach the grid
+        first_ring = max(0, self.bounds[0] - center_x, center_x - self.bounds[2],
+                         self.bounds[1] - center_y, center_y - self.bounds[3])
+
+        candidates = np.empty(0, dtype=np.int64)
+        distances = np.empty(0, dtype=np.float64)
+        for ring in range(first_ring, max_ring + 1):
+            positions = self._ring_positions(center_x, center_y, ring)
+            if len(positions):
+                candidates = np.concatenate((candidates, positions))
+                distances = np.concatenate((distances, np.hypot(self.xs[positions] - x, self.ys[positions] - y)))
+
+            # Every location outside the rings read so far is farther than ring * cell_size
+            if len(candidates) >= k and np.partition(distances, k - 1)[k - 1] <= ring * self.cell_size:
+                break
+
+        if max_distance is not None:
+            keep = distances <= max_distance
+            candidates, distances = candidates[keep], distances[keep]
+
+        best = np.lexsort((candidates, distances))[:k]
+        return [(self.locations[candidates[index]], float(distances[index])) for index in best]
+
+    def _cell(self, value: float) -> int:
+        return int(math.floor(value / self.cell_size))
+
+    def _positions(self, cells_x, cells_y) -> np.ndarray:
+        slices = [self.cells.get((cell_x, cell_y)) for cell_x in cells_x for cell_y in cells_y]
+        ranges = [np.arange(start, end) for start, end in filter(None, slices)]
+        return np.concatenate(ranges) if ranges else np.empty(0, dtype=np.int64)
+
+    def _ring_positions(self, center_x: int, center_y: int, ring: int) -> np.ndarray:
+        """Positions in the cells at Chebyshev distance `ring` from the center cell, within the grid bounds."""
+        if ring == 0:
+            return self._positions([center_x], [center_y])
+        min_x, min_y, max_x, max_y = self.bounds
+        columns = range(max(center_x - ring, min_x), min(center_x + ring, max_x) + 1)
+        rows = range(max(center_y - ring + 1, min_y), min(center_y + ring - 1, max_y) + 1)
+        edge_rows = [row for row in (center_y - ring, center_y + ring) if min_y <= row <= max_y]
+        edge_columns = [column for column in (center_x - ring, center_x + ring) if min_x <= column <= max_x]
+        return np.concatenate((self._positions(columns, edge_rows), self._positions(edge_columns, rows)))
+
+
+class SpatialIndex:
+    """Per-store StoreGrid over the coordinates of the locations."""
+
+    def __init__(self, locations: List[Dict[str, Any]], cell_size: Optional[float] = None):
+        by_store: Dict[str, List[Dict[str, Any]]] = {}
+        for location in locations:
+            by_store.setdefault(location["store_id"], []).append(location)
+        self.grids = {store_id: StoreGrid(store_locations, cell_size) for store_id, store_locations in by_store.items()}
+
+    def counts(self) -> Dict[str, int]:
+        return {"stores": len(self.grids), "locations": sum(len(grid) for grid in self.grids.values())}
+
+    def get(self, store_id: str) -> Optional[StoreGrid]:
+        return self.grids.get(store_id)
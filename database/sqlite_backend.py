@@ -0,0 +1,331 @@
+import asyncio
+import json
+import logging
+import re
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Same tables as the Supabase database. The primary keys of locations and
+# recipe_ingredients also serve the lookups by product_id and recipe_id.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    description TEXT,
+    category TEXT,
+    tags TEXT,
+    brand TEXT,
+    size TEXT,
+    weight REAL
+);
+CREATE TABLE IF NOT EXISTS stores (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    address TEXT,
+    aisles INTEGER,
+    sections INTEGER
+);
+CREATE TABLE IF NOT EXISTS locations (
+    product_id TEXT NOT NULL,
+    store_id TEXT NOT NULL,
+    aisle TEXT,
+    section TEXT,
+    shelf TEXT,
+    x_coordinate INTEGER,
+    y_coordinate INTEGER,
+    PRIMARY KEY (product_id, store_id)
+);
+CREATE TABLE IF NOT EXISTS recipes (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    description TEXT
+);
+CREATE TABLE IF NOT EXISTS recipe_ingredients (
+    recipe_id TEXT NOT NULL,
+    product_id TEXT NOT NULL,
+    quantity REAL,
+    unit TEXT,
+    PRIMARY KEY (recipe_id, product_id)
+);
+CREATE TABLE IF NOT EXISTS search_logs (
+    id TEXT PRIMARY KEY,
+    search_type TEXT NOT NULL,
+    query_term TEXT NOT NULL,
+    found INTEGER NOT NULL,
+    timestamp TEXT NOT NULL,
+    details TEXT
+);
+CREATE INDEX IF NOT EXISTS products_name_idx ON products (name COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS products_category_idx ON products (category);
+CREATE INDEX IF NOT EXISTS stores_name_idx ON stores (name COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS locations_store_id_idx ON locations (store_id);
+CREATE INDEX IF NOT EXISTS recipes_name_idx ON recipes (name COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS recipe_ingredients_product_id_idx ON recipe_ingredients (product_id);
+CREATE INDEX IF NOT EXISTS search_logs_timestamp_idx ON search_logs (timestamp, id);
+CREATE INDEX IF NOT EXISTS search_logs_search_type_idx ON search_logs (search_type, timestamp);
+"""
+
+# Columns stored as JSON text and returned as lists/dicts, like Postgres arrays and jsonb
+JSON_COLUMNS = {
+    "products": ("tags",),
+    "search_logs": ("details",)
+}
+
+# Columns stored as 0/1 and returned as booleans
+BOOLEAN_COLUMNS = {
+    "search_logs": ("found",)
+}
+
+# Comparison operators of PostgREST logic trees (or=(...), and(...))
+OPERATORS = {"eq": "=", "neq": "!=", "lt": "<", "lte": "<=", "gt": ">", "gte": ">="}
+
+_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def identifier(name: str) -> str:
+    """Check that `name` is a plain column or table name and quote it."""
+    name = name.strip()
+    if not _IDENTIFIER.match(name):
+        raise ValueError(f"Invalid identifier: {name!r}")
+    return f'"{name}"'
+
+
+class SQLiteResponse:
+    """Result of a query, with the rows in `data` like a Supabase response."""
+
+    def __init__(self, data: List[Dict[str, Any]]):
+        self.data = data
+
+
+class SQLiteQuery:
+    """
+    Query builder with the subset of the Supabase/PostgREST builder used by product_api.
+
+    Filters are turned into a parametrized WHERE clause, so `apply_filters`
+    works unchanged on top of it.
+    """
+
+    def __init__(self, source: "SQLiteDataSource", table: str):
+        self.source = source
+        self.table = table
+        self.columns = "*"
+        self.conditions: List[str] = []
+        self.params: List[Any] = []
+        self.ordering: List[str] = []
+        self.row_limit: Optional[int] = None
+        self.row_offset: Optional[int] = None
+        self.rows_to_insert: Optional[List[Dict[str, Any]]] = None
+
+    def select(self, columns: str = "*"):
+        self.columns = "*" if columns.strip() == "*" else ", ".join(identifier(column) for column in columns.split(","))
+        return self
+
+    def eq(self, column: str, value):
+        return self._where(f"{identifier(column)} = ?", value)
+
+    def lt(self, column: str, value):
+        return self._where(f"{identifier(column)} < ?", value)
+
+    def gt(self, column: str, value):
+        return self._where(f"{identifier(column)} > ?", value)
+
+    def ilike(self, column: str, pattern: str):
+        # LIKE is case-insensitive in SQLite, with the same % and _ wildcards
+        return self._where(f"{identifier(column)} LIKE ?", pattern)
+
+    def in_(self, column: str, values: List[Any]):
+        values = list(values)
+        if not values:
+            return self._where("0")
+        return self._where(f"{identifier(column)} IN ({', '.join('?' * len(values))})", *values)
+
+    def contains(self, column: str, values: List[Any]):
+        """Array containment: every value must be in the JSON array stored in `column`."""
+        for value in values:
+            self._where(f"EXISTS (SELECT 1 FROM json_each({identifier(column)}) WHERE value = ?)", value)
+        return self
+
+    def or_(self, filters: str):
+        """PostgREST logic tree, e.g. 'timestamp.lt."x",and(timestamp.eq."x",id.lt."y")'."""
+        sql, params = logic_tree(filters, "OR")
+        return self._where(sql, *params)
+
+    def order(self, column: str, desc: bool = False):
+        # Same NULL placement as Postgres
+        self.ordering.append(f"{identifier(column)} {'DESC NULLS FIRST' if desc else 'ASC NULLS LAST'}")
+        return self
+
+    def limit(self, count: int):
+        self.row_limit = count
+        return self
+
+    def range(self, start: int, end: int):
+        self.row_offset = start
+        self.row_limit = end - start + 1
+        return self
+
+    def insert(self, rows):
+        self.rows_to_insert = rows if isinstance(rows, list) else [rows]
+        return self
+
+    def execute(self) -> SQLiteResponse:
+        if self.rows_to_insert is not None:
+            return SQLiteResponse(self.source.insert(self.table, self.rows_to_insert))
+
+        sql = f"SELECT {self.columns} FROM {identifier(self.table)}"
+        if self.conditions:
+            sql += " WHERE " + " AND ".join(f"({condition})" for condition in self.conditions)
+        if self.ordering:
+            sql += " ORDER BY " + ", ".join(self.ordering)
+        row_limit = self.row_limit
+        if self.source.max_rows is not None:
+            row_limit = self.source.max_rows if row_limit is None else min(row_limit, self.source.max_rows)
+        if row_limit is not None or self.row_offset is not None:
+            sql += f" LIMIT {int(row_limit if row_limit is not None else -1)} OFFSET {int(self.row_offset or 0)}"
+        return SQLiteResponse(self.source.select(self.table, sql, self.params))
+
+    def _where(self, condition: str, *params):
+        self.conditions.append(condition)
+        self.params.extend(params)
+        return self
+
+
+class AsyncSQLiteQuery(SQLiteQuery):
+    """SQLiteQuery whose execute is awaitable, like the async Supabase builder."""
+
+    async def execute(self) -> SQLiteResponse:
+        return await asyncio.to_thread(super().execute)
+
+
+class AsyncSQLiteClient:
+    """Async view of a SQLiteDataSource, used by the async endpoints."""
+
+    def __init__(self, source: "SQLiteDataSource"):
+        self.source = source
+
+    def table(self, name: str) -> AsyncSQLiteQuery:
+        return AsyncSQLiteQuery(self.source, name)
+
+
+class SQLiteDataSource:
+    """
+    Local data source backed by a SQLite database, a stand-in for Supabase.
+
+    `table()` returns a query builder compatible with the Supabase client.
+    Every thread gets its own connection. ":memory:" keeps the database in
+    memory, shared by all the threads of the process. With `max_rows`,
+    selects return at most that many rows without any error, like
+    PostgREST with its max-rows setting.
+    """
+
+    def __init__(self, path: str = "market.db", max_rows: Optional[int] = None):
+        self.max_rows = max_rows
+        self.uri = path.startswith("file:")
+        if path == ":memory:":
+            path, self.uri = f"file:market-{id(self)}?mode=memory&cache=shared", True
+        self.path = path
+        self._local = threading.local()
+
+        # Also keeps an in-memory database alive for the lifetime of the data source
+        self._schema_connection = self.connection()
+        self._schema_connection.executescript(SCHEMA)
+        self._schema_connection.commit()
+
+    def table(self, name: str) -> SQLiteQuery:
+        return SQLiteQuery(self, name)
+
+    def async_client(self) -> AsyncSQLiteClient:
+        return AsyncSQLiteClient(self)
+
+    def connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, uri=self.uri, check_same_thread=False)
+            connection.row_factory = sqlite3.Row
+            if not self.uri:
+                connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+        return connection
+
+    def select(self, table: str, sql: str, params: List[Any]) -> List[Dict[str, Any]]:
+        rows = self.connection().execute(sql, params).fetchall()
+        return [self._decode(table, dict(row)) for row in rows]
+
+    def insert(self, table: str, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if not rows:
+            return []
+        columns = list(dict.fromkeys(column for row in rows for column in row))
+        sql = (f"INSERT INTO {identifier(table)} ({', '.join(identifier(column) for column in columns)}) "
+               f"VALUES ({', '.join('?' * len(columns))})")
+        connection = self.connection()
+        with connection:
+            connection.executemany(sql, [self._encode(table, row, columns) for row in rows])
+        return rows
+
+    @staticmethod
+    def _encode(table: str, row: Dict[str, Any], columns: List[str]) -> Tuple:
+        json_columns = JSON_COLUMNS.get(table, ())
+        return tuple(
+            json.dumps(row.get(column)) if column in json_columns and row.get(column) is not None else row.get(column)
+            for column in columns
+        )
+
+    @staticmethod
+    def _decode(table: str, row: Dict[str, Any]) -> Dict[str, Any]:
+        for column in JSON_COLUMNS.get(table, ()):
+            if row.get(column) is not None:
+                row[column] = json.loads(row[column])
+        for column in BOOLEAN_COLUMNS.get(table, ()):
+            if row.get(column) is not None:
+                row[column] = bool(row[column])
+        return row
+
+
+def logic_tree(expression: str, joiner: str) -> Tuple[str, List[Any]]:
+    """
+    Translate the conditions of a PostgREST logic tree into SQL.
+
+    Supports "column.operator.value" conditions (values optionally
+    double-quoted, with \\ escaping backslashes and quotes inside) nested
+    in and(...)/or(...) groups.
+    """
+    parts, params = [], []
+    for item in split_top_level(expression):
+        group = re.match(r"^(and|or)\((.*)\)$", item, re.S)
+        if group:
+            sql, group_params = logic_tree(group.group(2), group.group(1).upper())
+        else:
+            column, operator, value = item.split(".", 2)
+            if operator not in OPERATORS:
+                raise ValueError(f"Unsupported operator: {operator!r}")
+            if len(value) >= 2 and value[0] == value[-1] == '"':
+                value = re.sub(r"\\(.)", r"\1", value[1:-1], flags=re.S)
+            sql, group_params = f"{identifier(column)} {OPERATORS[operator]} ?", [value]
+        parts.append(f"({sql})")
+        params.extend(group_params)
+    return f" {joiner} ".join(parts), params
+
+
+def split_top_level(expression: str) -> List[str]:
+    """Split on the commas that are neither inside parentheses nor inside quotes."""
+    items, depth, quoted, escaped, start = [], 0, False, False, 0
+    for position, char in enumerate(expression):
+        if escaped:
+            escaped = False
+        elif quoted and char == "\\":
+            escaped = True
+        elif char == '"':
+            quoted = not quoted
+        elif not quoted and char == "(":
+            depth += 1
+        elif not quoted and char == ")":
+            depth -= 1
+        elif not quoted and depth == 0 and char == ",":
+            items.append(expression[start:position].strip())
+            start = position + 1
+    items.append(expression[start:].strip())
+    return [item for item in items if item]
@@ -1,5 +1,7 @@
+import asyncio
 import os
-from supabase import create_client, Client
+from typing import Optional
+from supabase import create_client, Client, acreate_client, AsyncClient
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -7,3 +9,26 @@ load_dotenv()
 url = os.environ.get("SUPABASE_URL")
 key = os.environ.get("SUPABASE_KEY")
 supabase: Client = create_client(str(url), str(key))
+
+# Async client used by the async endpoints, created on first use
+async_supabase: Optional[AsyncClient] = None
+_async_supabase_lock = asyncio.Lock()
+
+async def get_async_supabase() -> AsyncClient:
+    """
+    Return the shared async Supabase client.
+
+    All queries go through the same PostgREST HTTP session, whose
+    keep-alive connection pool is reused across requests.
+    """
+    global async_supabase
+    if async_supabase is None:
+        async with _async_supabase_lock:
+            if async_supabase is None:
+                async_supabase = await acreate_client(str(url), str(key))
+    return async_supabase
+
+async def close_async_supabase():
+    """Close the connections of the async client, if it was created."""
+    if async_supabase is not None:
+        await async_supabase.postgrest.aclose()
@@ -0,0 +1,30 @@
+import os
+import sys
+
+import pytest
+
+# product_api reads its configuration when imported
+os.environ["DATA_BACKEND"] = "sqlite"
+os.environ["SQLITE_PATH"] = ":memory:"
+os.environ["CATALOG_CACHE_ENABLED"] = "false"
+os.environ["SEMANTIC_INDEX_PATH"] = ""
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlite_backend import SQLiteDataSource
+
+
+@pytest.fixture
+def data_source(monkeypatch):
+    """Empty in-memory SQLite database used by product_api, capped at 1000 rows per select like PostgREST."""
+    import product_api
+
+    source = SQLiteDataSource(":memory:", max_rows=1000)
+    monkeypatch.setattr(product_api, "active_data_source", source)
+
+    # Snapshots loaded by a previous test are rebuilt from the new database
+    for cache in product_api.snapshot_caches:
+        if cache.current is not None:
+            cache.reload()
+    product_api.recipe_cache.clear()
+    return source
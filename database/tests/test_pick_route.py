@@ -0,0 +1,36 @@
+import random
+import time
+
+from pick_route import StoreRouteGraph, plan_route
+
+
+def test_plan_route_with_100_stops():
+    rnd = random.Random(7)
+    locations = [
+        {"product_id": f"p{index}", "aisle": str(aisle), "x_coordinate": aisle * 10, "y_coordinate": rnd.randint(0, 60)}
+        for index, aisle in enumerate(rnd.randint(1, 15) for _ in range(300))
+    ]
+    graph = StoreRouteGraph(locations, aisles=15)
+    stops = rnd.sample(locations, 100)
+    distances = graph.point_distances([graph.entrance()] + [
+        (stop["aisle"], stop["x_coordinate"], stop["y_coordinate"]) for stop in stops
+    ])
+
+    started = time.perf_counter()
+    order, legs = plan_route(distances)
+    elapsed = time.perf_counter() - started
+
+    assert sorted(order) == list(range(1, 101))
+    path = [0] + order
+    assert legs == [distances[path[position - 1], path[position]] for position in range(1, len(path))]
+
+    # Never longer than the nearest neighbour path 2-opt starts from
+    nearest, remaining = [0], set(range(1, 101))
+    while remaining:
+        point = min(remaining, key=lambda candidate: (distances[nearest[-1], candidate], candidate))
+        nearest.append(point)
+        remaining.remove(point)
+    assert sum(legs) <= sum(distances[a, b] for a, b in zip(nearest, nearest[1:])) + 1e-6
+
+    # Generous bound against pathological slowdowns, about 10 ms here
+    assert elapsed < 0.25
@@ -0,0 +1,69 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+import product_api
+
+
+def test_get_data_in_reads_batches_past_max_rows(data_source, monkeypatch):
+    monkeypatch.setattr(product_api, "IN_QUERY_BATCH_SIZE", 500)
+    store_ids = [f"s{store}" for store in range(3)]
+    product_ids = [f"p{product:04d}" for product in range(1000)]
+    data_source.table("locations").insert([
+        {"product_id": product_id, "store_id": store_id, "aisle": "1"}
+        for product_id in product_ids for store_id in store_ids
+    ]).execute()
+
+    # 500 ids x 3 stores = 1500 rows per batch, above the 1000 rows of a select
+    locations = asyncio.run(product_api.get_data_in("locations", "product_id", product_ids, ["product_id", "store_id"]))
+
+    assert len(locations) == 3000
+    assert {(location["product_id"], location["store_id"]) for location in locations} == {
+        (product_id, store_id) for product_id in product_ids for store_id in store_ids
+    }
+
+
+def test_logs_cursor_values_with_quotes_and_commas(data_source):
+    # Same timestamp, so the pages are told apart by the ids in the cursor
+    timestamp = "2026-01-01T12:00:00"
+    ids = ['a"b', "a,b", "a)b", "a\\", 'a\\"),or(id.neq."x', "b"]
+    data_source.table("search_logs").insert([
+        {"id": log_id, "search_type": "product", "query_term": f'"latte", {log_id}', "found": True, "timestamp": timestamp}
+        for log_id in ids
+    ]).execute()
+    client = TestClient(product_api.app)
+
+    pages, cursor = [], None
+    while True:
+        response = client.get("/logs/", params={"limit": 1, **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200
+        pages += [log["id"] for log in response.json()]
+        cursor = response.headers.get("x-next-cursor")
+        if not cursor:
+            break
+
+    assert pages == sorted(ids, reverse=True)
+
+
+def test_keyset_condition_escapes_values(data_source):
+    rows = [{"id": log_id, "search_type": "product", "query_term": "x", "found": True, "timestamp": "t"}
+            for log_id in ('a"', "a,", "a)", "a\\", "b")]
+    data_source.table("search_logs").insert(rows).execute()
+
+    condition = product_api.keyset_condition([("timestamp", 't"),id.gt.("'), ("id", 'a",id.neq."')], "lt")
+    found = data_source.table("search_logs").select("id").or_(condition).execute().data
+
+    # Only the timestamp comparison can match: "t" < 't"),id.gt.("'
+    assert sorted(row["id"] for row in found) == sorted(row["id"] for row in rows)
+
+
+def test_recipe_etag(data_source):
+    data_source.table("recipes").insert([{"id": "r1", "name": "Pasta al pomodoro", "description": ""}]).execute()
+    client = TestClient(product_api.app)
+
+    response = client.get("/recipes/r1")
+    assert response.status_code == 200
+    assert client.get("/recipes/r1", headers={"If-None-Match": response.headers["etag"]}).status_code == 304
+
+    assert client.get("/recipes/nope").status_code == 404
+    assert client.get("/recipes/nope", headers={"If-None-Match": response.headers["etag"]}).status_code == 404
@@ -0,0 +1,38 @@
+from product_search import ACCEPT_GROWTH, BM25Index
+
+
+def full_order(index, text, accept):
+    """Every accepted match, best score first and ties in load order, as search() should return them."""
+    positions, scores = index.matches(text)
+    ranked = sorted(zip(scores.tolist(), positions.tolist()), key=lambda match: (-match[0], match[1]))
+    return [(index.records[position]["id"], score) for score, position in ranked if accept(index.records[position])]
+
+
+def test_search_grows_candidates_when_accept_rejects_many():
+    # Many ties: products only differ by their id and the repeated words of their name
+    records = [
+        {"id": f"p{number:03d}", "name": "pasta " + "integrale " * (number % 5), "category": "pasta"}
+        for number in range(400)
+    ]
+    index = BM25Index(records)
+    limit = 5
+    accepted = {f"p{number:03d}" for number in range(3, 400, 37)}
+    accept = lambda record: record["id"] in accepted
+
+    results = index.search("pasta integrale", limit, accept=accept)
+
+    expected = full_order(index, "pasta integrale", accept)[:limit]
+    assert [(record["id"], score) for record, score in results] == expected
+    # The accepted products come after more than limit * ACCEPT_GROWTH rejected candidates
+    ranked = full_order(index, "pasta integrale", lambda record: True)
+    last = [product_id for product_id, _ in ranked].index(expected[-1][0])
+    assert last + 1 - limit > limit * ACCEPT_GROWTH
+
+
+def test_search_without_accept_keeps_ties_in_load_order():
+    records = [{"id": f"p{number:03d}", "name": "latte fresco" if number % 3 else "latte"} for number in range(100)]
+    index = BM25Index(records)
+
+    results = index.search("latte fresco", 10)
+
+    assert [(record["id"], score) for record, score in results] == full_order(index, "latte fresco", lambda record: True)[:10]